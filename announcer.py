@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de anuncios de nuevos DNIs.
+
+Los modales solo encolan el embed; una tarea en segundo plano agrupa varios
+en un mismo mensaje (hasta los límites de Discord), espaciando los envíos y
+reintentando los fallos sin bloquear a quien registró el DNI.
+"""
+
+import asyncio
+import time
+
+import aiohttp
+import discord
+
+MAX_EMBEDS     = 10    # embeds por mensaje (límite de Discord)
+MAX_CHARS      = 6000  # caracteres totales de los embeds de un mensaje
+BATCH_WINDOW   = 2.0   # segundos que se espera a que lleguen más anuncios
+SEND_INTERVAL  = 1.5   # separación mínima entre mensajes al canal
+MAX_RETRIES    = 5
+
+
+class AnnounceDispatcher:
+    def __init__(self, client: discord.Client, channel_id: int):
+        self.client = client
+        self.channel_id = channel_id
+        self.queue = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self._carry = None  # embed que no cupo en el lote anterior
+        self._next_send = 0.0
+        self._task = None
+
+    def enqueue(self, emb: discord.Embed):
+        self.queue.put_nowait(emb)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._send(batch)
+            except Exception as e:  # un fallo inesperado no puede matar la tarea
+                self.failed += len(batch)
+                print(f"⚠️ Error anunciando {len(batch)} DNIs: {e!r}")
+
+    async def _next_batch(self) -> list:
+        first = self._carry or await self.queue.get()
+        self._carry = None
+        batch, chars = [first], len(first)
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < MAX_EMBEDS:
+            try:
+                emb = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    emb = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if chars + len(emb) > MAX_CHARS:
+                self._carry = emb
+                break
+            batch.append(emb)
+            chars += len(emb)
+        return batch
+
+    async def _send(self, batch: list):
+        for intento in range(MAX_RETRIES):
+            espera = self._next_send - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            canal = self.client.get_channel(self.channel_id)
+            if canal is None:
+                self.failed += len(batch)
+                return
+            try:
+                await canal.send(embeds=batch)
+            except discord.RateLimited as e:
+                # 429 con una espera más larga de la que discord.py aguanta por dentro
+                self._next_send = time.monotonic() + e.retry_after
+                continue
+            except discord.HTTPException as e:
+                # Los 429 normales los espera discord.py; aquí llegan los 5xx
+                self._next_send = time.monotonic() + 2 ** intento
+                if e.status != 429 and e.status < 500:
+                    break  # error permanente (permisos, embed inválido...)
+                continue
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError):
+                self._next_send = time.monotonic() + 2 ** intento  # conexión caída o sin respuesta
+                continue
+            finally:
+                self._next_send = max(self._next_send, time.monotonic() + SEND_INTERVAL)
+            self.sent += len(batch)
+            return
+        self.failed += len(batch)
+        print(f"⚠️ No se pudieron anunciar {len(batch)} DNIs.")
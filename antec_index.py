@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Índice invertido de los antecedentes de una partición.
+
+Cada antecedente se identifica por ``(uid, id)`` y aparece en:
+
+- ``por_tipo``: tipo normalizado -> claves.
+- ``por_palabra``: palabra normalizada de la descripción -> claves.
+- una lista ordenada de (fecha ordinal, uid, id) para rangos de fechas con
+  bisect (las fechas que no son DD/MM/AAAA válidas no entran).
+
+Una búsqueda parte del filtro más selectivo (el conjunto más pequeño o el
+tramo de fechas más corto) y comprueba el resto por pertenencia, así que
+cuesta lo que ocupan los candidatos y no el total de antecedentes.
+"""
+
+import datetime
+import re
+from bisect import bisect_left, insort
+
+from records import fecha_a_ordinal
+from registry import normalizar
+
+MIN_PALABRA = 3  # palabras más cortas («de», «la»...) no se indexan
+
+
+def palabras(texto: str) -> set:
+    return {p for p in re.findall(r"\w+", normalizar(texto or "")) if len(p) >= MIN_PALABRA}
+
+
+def fecha_consulta(texto: str, fin: bool = False):
+    """DD/MM/AAAA, o MM/AAAA para todo el mes (su primer o último día) -> ordinal; None si no vale."""
+    texto = texto.strip()
+    if re.fullmatch(r"\d{2}/\d{4}", texto):
+        m, a = map(int, texto.split("/"))
+        try:
+            inicio = datetime.date(a, m, 1)
+        except ValueError:
+            return None
+        if not fin:
+            return inicio.toordinal()
+        return (inicio + datetime.timedelta(days=31)).replace(day=1).toordinal() - 1
+    valor = fecha_a_ordinal(texto)
+    return valor if isinstance(valor, int) else None
+
+
+class AntecedentesIndex:
+    def __init__(self, db: dict):
+        self.db = db  # uid -> Antecedentes (el dict del almacén)
+        self.rebuild()
+
+    def rebuild(self):
+        """Reconstruye el índice desde ``db`` (al cargar o tras una importación)."""
+        self.por_tipo = {}
+        self.tipos = {}        # tipo normalizado -> cómo se escribió (para autocompletar)
+        self.por_palabra = {}
+        self._fechas = []
+        self._sin_ordenar = []  # fechas de add_many(ordenar=False) a la espera de ordenar()
+        for uid, ants in self.db.items():
+            for a in ants:
+                self._indexar(uid, a)
+                if isinstance(a.fecha, int):
+                    self._fechas.append((a.fecha, uid, a.id))
+        self._fechas.sort()
+
+    def _indexar(self, uid: str, a):
+        clave = (uid, a.id)
+        t = normalizar(a.tipo or "")
+        self.por_tipo.setdefault(t, set()).add(clave)
+        self.tipos.setdefault(t, a.tipo)
+        for p in palabras(a.descripcion):
+            self.por_palabra.setdefault(p, set()).add(clave)
+
+    def add(self, uid: str, a):
+        self._indexar(uid, a)
+        if isinstance(a.fecha, int):
+            insort(self._fechas, (a.fecha, uid, a.id))
+
+    def add_many(self, pares, ordenar: bool = True):
+        """Alta masiva de ``(uid, antecedente)`` con un solo sort de las fechas.
+
+        Con ``ordenar=False`` (importación por lotes) las fechas esperan a
+        ``ordenar()``; tipo y palabras se indexan al momento.
+        """
+        for uid, a in pares:
+            self._indexar(uid, a)
+            if isinstance(a.fecha, int):
+                self._sin_ordenar.append((a.fecha, uid, a.id))
+        if ordenar:
+            self.ordenar()
+
+    def ordenar(self):
+        if self._sin_ordenar:
+            self._fechas += self._sin_ordenar
+            self._fechas.sort()
+            self._sin_ordenar = []
+
+    def remove(self, uid: str, a):
+        clave = (uid, a.id)
+        t = normalizar(a.tipo or "")
+        _descartar(self.por_tipo, t, clave)
+        if t not in self.por_tipo:
+            self.tipos.pop(t, None)
+        for p in palabras(a.descripcion):
+            _descartar(self.por_palabra, p, clave)
+        if isinstance(a.fecha, int):
+            i = bisect_left(self._fechas, (a.fecha, uid, a.id))
+            if i < len(self._fechas) and self._fechas[i] == (a.fecha, uid, a.id):
+                del self._fechas[i]
+            elif self._sin_ordenar and (a.fecha, uid, a.id) in self._sin_ordenar:
+                self._sin_ordenar.remove((a.fecha, uid, a.id))
+
+    def remove_all(self, uid: str, ants):
+        for a in ants:
+            self.remove(uid, a)
+
+    def buscar(self, tipo: str = None, texto: str = None, desde: int = None, hasta: int = None) -> list:
+        """Claves ``(uid, id)`` que cumplen todos los filtros, de la fecha más reciente a la más antigua.
+
+        ``desde``/``hasta`` son ordinales inclusivos; sin ningún filtro no devuelve nada.
+        """
+        conjuntos = []
+        if tipo:
+            conjuntos.append(self.por_tipo.get(normalizar(tipo.strip()), set()))
+        conjuntos.extend(self.por_palabra.get(p, set()) for p in palabras(texto))
+        con_rango = desde is not None or hasta is not None
+        if not conjuntos and not con_rango:
+            return []
+        conjuntos.sort(key=len)
+        if conjuntos and not conjuntos[0]:
+            return []
+
+        if con_rango:
+            lo = bisect_left(self._fechas, (desde,)) if desde is not None else 0
+            hi = bisect_left(self._fechas, (hasta + 1,)) if hasta is not None else len(self._fechas)
+        if con_rango and (not conjuntos or hi - lo <= len(conjuntos[0])):
+            # El tramo de fechas es el filtro más pequeño y ya viene ordenado
+            return [(u, i) for _, u, i in reversed(self._fechas[lo:hi])
+                    if all((u, i) in s for s in conjuntos)]
+
+        base, resto = conjuntos[0], conjuntos[1:]
+        out = []
+        for clave in base:
+            if not all(clave in s for s in resto):
+                continue
+            f = self.db[clave[0]].get(clave[1]).fecha
+            if con_rango and not (isinstance(f, int)
+                                  and (desde is None or f >= desde) and (hasta is None or f <= hasta)):
+                continue
+            out.append((f if isinstance(f, int) else -1, clave))
+        out.sort(reverse=True)
+        return [clave for _, clave in out]
+
+
+def _descartar(indice: dict, k, clave):
+    s = indice.get(k)
+    if s is not None:
+        s.discard(clave)
+        if not s:
+            del indice[k]
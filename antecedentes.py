@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Antecedentes de un usuario con ids estables.
+
+Los ids salen de un contador por usuario que nunca retrocede, así que un
+id mostrado en una ficha sigue refiriéndose al mismo antecedente. Borrar
+deja una lápida (O(1)); las lápidas se compactan cuando pasan de la mitad.
+"""
+
+from itertools import islice
+
+from records import Antecedente
+
+COMPACTAR_MIN = 8  # no compactar listas pequeñas
+
+
+class Antecedentes:
+    __slots__ = ("seq", "_items", "_pos", "_muertos")
+
+    def __init__(self, items=(), seq: int = 0):
+        self.seq = seq          # último id asignado
+        self._items = []        # registros en orden de id; None = lápida
+        self._pos = {}          # id -> índice en _items
+        self._muertos = 0
+        for a in items:
+            self._pos[a.id] = len(self._items)
+            self._items.append(a)
+            self.seq = max(self.seq, a.id)
+
+    @classmethod
+    def from_json(cls, value) -> "Antecedentes":
+        """Acepta ``{"seq", "items"}`` o la lista antigua de antecedentes."""
+        if isinstance(value, list):
+            return cls(map(Antecedente.from_json, value))
+        return cls(map(Antecedente.from_json, value["items"]), value["seq"])
+
+    def to_json(self) -> dict:
+        return {"seq": self.seq, "items": [a.to_json() for a in self]}
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def __iter__(self):
+        return (a for a in self._items if a is not None)
+
+    def get(self, aid: int):
+        i = self._pos.get(aid)
+        return None if i is None else self._items[i]
+
+    def page(self, page: int, size: int):
+        """Antecedentes de la página ``page`` (desde 0) sin copiar la lista."""
+        return islice(iter(self), page * size, (page + 1) * size)
+
+    def add(self, tipo: str, fecha: str, descripcion: str) -> Antecedente:
+        self.seq += 1
+        rec = Antecedente(self.seq, tipo, fecha, descripcion)
+        self._pos[rec.id] = len(self._items)
+        self._items.append(rec)
+        return rec
+
+    def remove(self, aid: int):
+        """Borra el antecedente ``aid``; devuelve el registro o None si no existe."""
+        i = self._pos.pop(aid, None)
+        if i is None:
+            return None
+        rec, self._items[i] = self._items[i], None
+        self._muertos += 1
+        if self._muertos >= COMPACTAR_MIN and self._muertos * 2 > len(self._items):
+            self._compact()
+        return rec
+
+    def clear(self):
+        """Borra todos los antecedentes conservando el contador de ids."""
+        self._items, self._pos, self._muertos = [], {}, 0
+
+    def _compact(self):
+        self._items = list(self)
+        self._pos = {a.id: i for i, a in enumerate(self._items)}
+        self._muertos = 0
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de los caminos calientes del bot, sin conexión a Discord.
+
+Genera datos sintéticos (DNIs y antecedentes con reparto sesgado), y ejecuta
+los manejadores reales de main.py contra una Interaction de pega:
+
+    python bench.py                      # 1k, 10k y 100k ciudadanos
+    python bench.py -n 1000 -n 1000000   # tamaños a elegir
+    STORAGE_BACKEND=sqlite python bench.py
+
+Cada tamaño corre en un subproceso propio (datos en un directorio temporal)
+para que la memoria pico y el arranque se midan por separado.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+GUILD_ID = 42  # servidor ficticio cuya partición se genera
+
+
+# ───── Datos sintéticos ─────
+NOMBRES   = ["Ana", "Luis", "María", "José", "Lucía", "Carlos", "Elena", "Javier", "Sofía", "Pablo"]
+APELLIDOS = ["García", "Martínez", "López", "Sánchez", "Pérez", "Gómez", "Martín", "Jiménez", "Ruiz", "Núñez"]
+TIPOS     = ["Robo", "Hurto", "Agresión", "Tráfico", "Estafa", "Vandalismo", "Exceso de velocidad"]
+NACIONES  = ["ESP", "ESP", "ESP", "FRA", "ITA", "MAR", "ARG"]
+
+
+def dni_sintetico(i: int) -> str:
+    return f"{i:09d}{'TRWAGMYFPDXBNJZSQVHLCKE'[i % 23]}"
+
+
+def generar(n: int, seed: int = 1234):
+    """Devuelve (dnis, antecedentes) con ``n`` ciudadanos.
+
+    Un 30 % tiene antecedentes; cuántos sigue una Pareto (la mayoría 1-2,
+    unos pocos con cientos).
+    """
+    rnd = random.Random(seed)
+    dnis, ants = {}, {}
+    for i in range(n):
+        uid = str(10**17 + i)
+        dnis[uid] = {
+            "nombre":       rnd.choice(NOMBRES),
+            "apellidos":    f"{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+            "dni":          dni_sintetico(i),
+            "nacimiento":   f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/{rnd.randint(1950, 2005)}",
+            "sexo":         rnd.choice("HM"),
+            "nacionalidad": rnd.choice(NACIONES),
+            "expedicion":   "01/01/2025",
+            "caducidad":    "01/01/2035",
+        }
+        if rnd.random() < 0.3:
+            k = min(int(rnd.paretovariate(1.2)), 300)
+            items = [{
+                "id": j,
+                "tipo": rnd.choice(TIPOS),
+                "fecha": f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/{rnd.randint(2020, 2025)}",
+                "descripcion": "Descripción sintética del antecedente número %d." % j,
+            } for j in range(1, k + 1)]
+            ants[uid] = {"seq": k, "items": items}
+    return dnis, ants
+
+
+# ───── Interaction de pega ─────
+class FakeUser:
+    def __init__(self, uid: int, name: str = "Agente"):
+        self.id = uid
+        self.display_name = name
+        self.mention = f"<@{uid}>"
+
+    async def send(self, *args, **kwargs):
+        return None
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+        self.sent = None
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content=None, **kwargs):
+        self._done, self.sent = True, (content, kwargs)
+
+    async def edit_message(self, **kwargs):
+        self._done, self.sent = True, (None, kwargs)
+
+    async def send_modal(self, modal):
+        self._done, self.sent = True, (None, {"modal": modal})
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    async def send(self, content=None, **kwargs):
+        return None
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser):
+        self.user = user
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.extras = {}
+        self.command = None
+        self.guild_id = GUILD_ID
+
+
+def rellenar(modal, **campos):
+    """Da valor a los TextInput de un modal como si el usuario los hubiera escrito."""
+    for nombre, valor in campos.items():
+        getattr(modal, nombre)._value = valor
+    return modal
+
+
+# ───── Medición ─────
+def resumen(nombre: str, tiempos: list) -> dict:
+    tiempos = sorted(tiempos)
+    total = sum(tiempos)
+    return {
+        "caso": nombre,
+        "ops": len(tiempos),
+        "ops_s": len(tiempos) / total if total else float("inf"),
+        "p50_ms": statistics.median(tiempos) * 1000,
+        "p99_ms": tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))] * 1000,
+    }
+
+
+async def medir(nombre: str, iteraciones: int, fn) -> dict:
+    tiempos = []
+    for i in range(iteraciones):
+        t0 = time.perf_counter()
+        await fn(i)
+        tiempos.append(time.perf_counter() - t0)
+    return resumen(nombre, tiempos)
+
+
+def memoria_representaciones(datos: str) -> dict:
+    """MB retenidos al cargar los datos como dicts (antes) y como registros compactos."""
+    import tracemalloc
+    from records import DNI
+    from antecedentes import Antecedentes
+
+    def retenido(fn) -> float:
+        tracemalloc.start()
+        obj = fn()
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del obj
+        return actual / 2**20
+
+    def leer(nombre):
+        with open(os.path.join(datos, nombre), encoding="utf-8") as f:
+            return json.load(f)
+
+    return {
+        "dicts_mb": retenido(lambda: (leer("dni_data.json"), leer("antecedentes_data.json"))),
+        "compacta_mb": retenido(lambda: (
+            {k: DNI.from_json(v) for k, v in leer("dni_data.json").items()},
+            {k: Antecedentes.from_json(v) for k, v in leer("antecedentes_data.json").items()},
+        )),
+    }
+
+
+def memoria_pico_mb() -> float:
+    if resource is None:
+        return float("nan")
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 if sys.platform != "darwin" else kb / 1024 / 1024
+
+
+# ───── Trabajador (un tamaño de datos) ─────
+async def casos(main, part, n: int, iteraciones: int) -> list:
+    rnd = random.Random(99)
+    uids = list(part.registry.store.data)
+    con_ants = sorted(part.antec_db, key=lambda u: len(part.antec_db[u]), reverse=True)
+    agente = FakeUser(1, "Agente")
+    out = []
+
+    async def crear(i):
+        inter = FakeInteraction(FakeUser(2 * 10**17 + i, f"Nuevo{i}"))
+        modal = rellenar(main.CrearDNIModal(), nombre="Test", apellidos="Bench Bench",
+                         dni=dni_sintetico(n + i), nacimiento="01/01/1990", sex_nat="H ESP")
+        await modal.on_submit(inter)
+    out.append(await medir("CrearDNIModal.on_submit", iteraciones, crear))
+    main.announcer.queue = asyncio.Queue()
+
+    async def quitar(i):
+        uid = con_ants[i % max(1, min(len(con_ants), 50))]
+        ants = part.antec_db[uid]
+        aid = next(iter(ants)).id if len(ants) else 0
+        modal = rellenar(main.QuitarUnoModal(FakeUser(int(uid))), antecedente_id=str(aid), motivo="bench")
+        await modal.on_submit(FakeInteraction(agente))
+    if con_ants:
+        out.append(await medir("QuitarUnoModal.on_submit", iteraciones, quitar))
+
+    async def ficha(i):
+        uid = rnd.choice(uids)
+        await main.fichapolicia.callback(FakeInteraction(agente), FakeUser(int(uid), "Sospechoso"))
+    out.append(await medir("fichapolicia", iteraciones, ficha))
+
+    async def buscar(i):
+        tipo = TIPOS[i % len(TIPOS)]
+        mes = f"{i % 12 + 1:02d}/{2020 + i % 6}"
+        await main.buscarantecedentes.callback(FakeInteraction(agente), tipo=tipo, texto=None, desde=mes, hasta=mes)
+    out.append(await medir(f"buscarantecedentes (tipo + mes, {len(part.antec_index.tipos)} tipos)", iteraciones, buscar))
+
+    pesado = con_ants[0] if con_ants else uids[0]
+    usuario = FakeUser(int(pesado), "Sospechoso")
+    rec, ants = part.registry.get(pesado), part.antec_db.get(pesado) or main.Antecedentes()
+    paginas = max(1, (len(ants) - 1) // main.ANT_PAG + 1)
+
+    async def render(i):
+        main.embed_ficha(usuario, rec, ants, i % paginas)
+    out.append(await medir(f"embed_ficha ({len(ants)} antecedentes)", iteraciones, render))
+
+    async def pagina(i):
+        main.ficha_pagina(part, usuario, rec, ants, i % paginas, part.ficha_version.get(pesado, 0))
+    out.append(await medir("ficha_pagina (caché)", iteraciones, pagina))
+
+    async def volcar(i):
+        await main.writer.flush()
+    out.append(await medir("writer.flush", 1, volcar))
+    return out
+
+
+def trabajador(n: int, iteraciones: int):
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="dnibench-") as base:
+        try:
+            medir_en(base, n, iteraciones)
+        finally:
+            os.chdir(cwd)  # salir del directorio antes de borrarlo
+
+
+def medir_en(base: str, n: int, iteraciones: int):
+    datos = os.path.join(base, "datos", str(GUILD_ID))
+    os.makedirs(datos)
+    dnis, ants = generar(n)
+    with open(os.path.join(datos, "dni_data.json"), "w", encoding="utf-8") as f:
+        json.dump(dnis, f, ensure_ascii=False)
+    with open(os.path.join(datos, "antecedentes_data.json"), "w", encoding="utf-8") as f:
+        json.dump(ants, f, ensure_ascii=False)
+    n_ants = sum(len(a["items"]) for a in ants.values())
+    del dnis, ants
+
+    os.chdir(base)
+    os.environ["DATA_DIR"] = "datos"
+    sys.path.insert(0, AQUI)
+    if os.getenv("STORAGE_BACKEND", "json").lower() == "sqlite":
+        import storage, partitions
+        storage.SqliteDB(os.path.join(datos, partitions.SQLITE_NAME)).import_json(
+            os.path.join(datos, "dni_data.json"), os.path.join(datos, "antecedentes_data.json"))
+
+    import main
+
+    async def run():
+        t0 = time.perf_counter()
+        part = await main.particiones.obtener(GUILD_ID)
+        carga = time.perf_counter() - t0
+        return carga, await casos(main, part, n, iteraciones)
+    carga, resultados = asyncio.run(run())
+    pico = memoria_pico_mb()  # antes del informe de memoria, que carga los datos dos veces más
+    print(json.dumps({
+        "ciudadanos": n,
+        "antecedentes": n_ants,
+        "carga_s": carga,
+        "memoria_pico_mb": pico,
+        "memoria": memoria_representaciones(datos),
+        "casos": resultados,
+    }))
+
+
+# ───── Informe ─────
+def informe(r: dict):
+    print(f"\n== {r['ciudadanos']:,} ciudadanos / {r['antecedentes']:,} antecedentes ==")
+    print(f"   arranque (load): {r['carga_s']:.3f} s   memoria pico: {r['memoria_pico_mb']:.1f} MB")
+    m = r["memoria"]
+    print(f"   datos en memoria: dicts {m['dicts_mb']:.1f} MB -> compactos {m['compacta_mb']:.1f} MB "
+          f"({1 - m['compacta_mb'] / m['dicts_mb']:.0%} menos)")
+    print(f"   {'caso':<42} {'ops':>6} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for c in r["casos"]:
+        print(f"   {c['caso']:<42} {c['ops']:>6} {c['ops_s']:>10.0f} {c['p50_ms']:>9.3f} {c['p99_ms']:>9.3f}")
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-n", "--ciudadanos", type=int, action="append", help="tamaño del conjunto (repetible)")
+    p.add_argument("-i", "--iteraciones", type=int, default=500)
+    p.add_argument("--json", action="store_true", help="salida en JSON por líneas")
+    p.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker is not None:
+        return trabajador(args.worker, args.iteraciones)
+
+    for n in args.ciudadanos or [1_000, 10_000, 100_000]:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", str(n), "-i", str(args.iteraciones)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.exit(proc.stderr)
+        linea = proc.stdout.strip().splitlines()[-1]
+        if args.json:
+            print(linea)
+        else:
+            informe(json.loads(linea))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Importación y exportación masiva de DNIs y antecedentes (CSV o JSONL).
+
+La importación descarga el adjunto a un fichero temporal por trozos, lo lee
+fila a fila y valida cada una con las mismas reglas que los modales
+(``records.validar_dni`` / ``validar_antecedente``). Las filas válidas se
+aplican juntas, con un solo volcado a disco, y las demás vuelven en un
+informe con su número de línea.
+
+La exportación escribe fila a fila en un fichero temporal; de los datos en
+memoria solo se copia la lista de claves.
+"""
+
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import shutil
+
+import aiohttp
+
+from antecedentes import Antecedentes
+from records import DNI, validar_antecedente, validar_dni
+
+MAX_IMPORTAR = int(os.getenv("MAX_IMPORTAR_MB", 25)) * 2**20
+MAX_INFORME  = 10_000  # líneas de error que se incluyen en el informe
+LOTE         = 2_000   # filas aplicadas entre cesiones del bucle de eventos
+
+CAMPOS_DNI   = ("uid",) + DNI.CAMPOS
+CAMPOS_ANTEC = ("uid", "id", "tipo", "fecha", "descripcion")
+
+
+def formato(nombre: str):
+    """'csv' o 'jsonl' según la extensión del fichero; None si no se reconoce.
+
+    ``.json`` no se acepta: un documento JSON normal (una lista con saltos de
+    línea) se leería mal como un objeto por línea.
+    """
+    ext = os.path.splitext(nombre.lower())[1]
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return None
+
+
+async def descargar(url: str, path: str):
+    """Guarda ``url`` en ``path`` por trozos, sin tener el fichero entero en memoria."""
+    async with aiohttp.ClientSession() as s, s.get(url) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            async for trozo in r.content.iter_chunked(64 * 1024):
+                f.write(trozo)
+
+
+# ───── Lectura y validación (en un hilo) ─────
+def leer_filas(path: str, fmt: str):
+    """Genera ``(línea, fila)``; ``fila`` es un dict de cadenas o el mensaje de error de esa línea."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            muestra = f.read(4096)
+            f.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            except csv.Error:
+                dialecto = csv.excel
+            lector = csv.DictReader(f, dialect=dialecto)
+            for fila in lector:
+                yield lector.line_num, {(k or "").strip().lower(): v for k, v in fila.items()}
+            return
+        for n, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                yield n, "❌ JSON inválido."
+                continue
+            if not isinstance(fila, dict):
+                yield n, "❌ Cada línea debe ser un objeto JSON."
+                continue
+            yield n, {str(k).lower(): ("" if v is None else str(v)) for k, v in fila.items()}
+
+
+def _uid(fila: dict) -> str:
+    uid = (fila.get("uid") or "").strip()
+    if not re.fullmatch(r"\d{15,20}", uid):
+        raise ValueError("❌ uid debe ser el ID de Discord del usuario.")
+    return uid
+
+
+def validar_dnis(filas, registry) -> tuple:
+    """``(válidos, errores)``: válidos son ``(uid, DNI)`` y errores ``(línea, mensaje)``."""
+    validos, errores = [], []
+    uids, dnis = set(), set()  # ya vistos en el fichero
+    existe = lambda d: d in dnis or registry.uid_for_dni(d) is not None
+    for linea, fila in filas:
+        try:
+            if isinstance(fila, str):
+                raise ValueError(fila)
+            uid = _uid(fila)
+            if uid in uids or uid in registry:
+                raise ValueError("❌ Ese usuario ya tiene DNI.")
+            data = validar_dni(*(fila.get(k) for k in ("nombre", "apellidos", "dni", "nacimiento", "sexo", "nacionalidad")),
+                               existe=existe, expedicion=fila.get("expedicion"), caducidad=fila.get("caducidad"))
+        except ValueError as e:
+            errores.append((linea, str(e)))
+            continue
+        uids.add(uid)
+        dnis.add(data["dni"])
+        validos.append((uid, DNI.from_json(data)))
+    return validos, errores
+
+
+def validar_antecedentes(filas, registry) -> tuple:
+    """``(válidos, errores)``: válidos son ``(uid, (tipo, fecha, descripcion))``.
+
+    Cada fila indica el ciudadano con ``uid`` o con su ``dni``.
+    """
+    validos, errores = [], []
+    for linea, fila in filas:
+        try:
+            if isinstance(fila, str):
+                raise ValueError(fila)
+            if (fila.get("uid") or "").strip():
+                uid = _uid(fila)
+            else:
+                uid = registry.uid_for_dni((fila.get("dni") or "").strip().upper())
+                if uid is None:
+                    raise ValueError("❌ Falta uid o el DNI no existe.")
+            campos = validar_antecedente(fila.get("tipo"), fila.get("fecha"), fila.get("descripcion"))
+        except ValueError as e:
+            errores.append((linea, str(e)))
+            continue
+        validos.append((uid, campos))
+    return validos, errores
+
+
+# ───── Aplicación (en el bucle de eventos) ─────
+async def aplicar(part, datos: str, validos: list, errores: list) -> int:
+    """Aplica las filas válidas por lotes para no bloquear el bucle; devuelve cuántas entraron.
+
+    Todo queda pendiente en los almacenes; el llamante retiene el escritor
+    (``BackgroundWriter.retener``) y vuelca después con un solo flush.
+    """
+    fn, indice = (_aplicar_dnis, part.registry) if datos == "dnis" else (_aplicar_antecedentes, part.antec_index)
+    n = 0
+    try:
+        for i in range(0, len(validos), LOTE):
+            n += fn(part, validos[i:i + LOTE], errores)
+            await asyncio.sleep(0)
+    finally:
+        indice.ordenar()  # un solo sort al final y no uno por lote
+    return n
+
+
+def _aplicar_dnis(part, validos, errores: list) -> int:
+    """Da de alta los DNIs válidos; los que se hayan duplicado mientras tanto van a ``errores``."""
+    nuevos = []
+    for uid, rec in validos:
+        if uid in part.registry or part.registry.uid_for_dni(rec.dni) is not None:
+            errores.append((None, f"❌ {rec.dni}: registrado por otra vía durante la importación."))
+        else:
+            nuevos.append((uid, rec))
+    part.registry.add_many(nuevos, ordenar=False)
+    return len(nuevos)
+
+
+def _aplicar_antecedentes(part, validos, errores: list) -> int:
+    tocados, nuevos = {}, []
+    for uid, campos in validos:
+        ants = tocados.get(uid)
+        if ants is None:
+            ants = part.antec_db.get(uid)
+            ants = tocados[uid] = ants if ants is not None else Antecedentes()
+        nuevos.append((uid, ants.add(*campos)))
+    for uid, ants in tocados.items():
+        part.antec_store.set(uid, ants)
+    part.antec_index.add_many(nuevos, ordenar=False)
+    return len(nuevos)
+
+
+def informe(errores: list) -> str:
+    lineas = [f"línea {n}: {msg}" if n is not None else msg for n, msg in sorted(errores, key=lambda e: e[0] or 0)[:MAX_INFORME]]
+    if len(errores) > MAX_INFORME:
+        lineas.append(f"... y {len(errores) - MAX_INFORME} errores más.")
+    return "\n".join(lineas) + "\n"
+
+
+# ───── Exportación (en un hilo) ─────
+def exportar(part, datos: str, fmt: str, path: str) -> int:
+    """Escribe los DNIs o antecedentes de la partición en ``path``; devuelve las filas escritas."""
+    dnis = datos == "dnis"
+    store = part.dni_store if dnis else part.antec_store
+    claves = list(store.data)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            escritor = csv.DictWriter(f, CAMPOS_DNI if dnis else CAMPOS_ANTEC)
+            escritor.writeheader()
+            escribir = escritor.writerow
+        else:
+            escribir = lambda fila: f.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        n = 0
+        for uid in claves:
+            rec = store.data.get(uid)
+            if rec is None:  # borrado mientras se exportaba
+                continue
+            for r in ([rec] if dnis else list(rec)):
+                escribir({"uid": uid, **r.to_json()})
+                n += 1
+    return n
+
+
+def comprimir(path: str) -> str:
+    with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return path + ".gz"
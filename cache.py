@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Caché LRU pequeño sobre OrderedDict."""
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def discard_where(self, pred):
+        """Elimina las entradas cuya clave cumple ``pred``."""
+        for key in [k for k in self._data if pred(k)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
@@ -6,71 +6,278 @@ y anuncio automático en canal al crear un nuevo DNI.
 """
 
 import re
-import json
 import os
+import io
+import csv
+import json
+import hashlib
+import time
 import webserver
 import datetime
 import asyncio
+import signal
+import tempfile
+import itertools
 
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands
+
+import storage
+import metrics
+import tracing
+import bulk
+from storage import BackgroundWriter
+import partitions
+from partitions import Particion, Particiones
+from antecedentes import Antecedentes
+from antec_index import fecha_consulta
+from records import DNI, validar_antecedente, validar_dni
+from registry import normalizar
+from cache import LRUCache
+import permissions
+from permissions import Permisos
+from announcer import AnnounceDispatcher
+from scheduler import DeletionScheduler, MAX_RETENCION
+
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 
+# Roles por defecto de los servidores que no los han configurado con /roles
 ADMIN_ROLE_IDS    = [1353412512208388189, 1353412517514449049]  # IDs de admins
 POLICE_ROLE_IDS   = [1353412567589982330, 1353412547558248571]                      # ID del rol "policías"
 ANNOUNCE_CHANNEL_ID = 1368950726453366854
+# Intent privilegiado (hay que activarlo en el portal de desarrolladores): sin
+# él no llega on_member_update y los permisos no se cachean, para que quitar
+# un rol surta efecto en la siguiente interacción
+MEMBERS_INTENT = os.getenv("MEMBERS_INTENT", "0") == "1"
 
-def tiene_rol_admin(inter: discord.Interaction) -> bool:
+permisos = Permisos(os.path.join(partitions.DATA_DIR, "roles.json"), ADMIN_ROLE_IDS, POLICE_ROLE_IDS,
+                    ttl=permissions.PERMISOS_TTL if MEMBERS_INTENT else 0)
+
+def nivel_permisos(inter: discord.Interaction) -> int:
     if not isinstance(inter.user, discord.Member):
-        return False
-    return any(r.id in ADMIN_ROLE_IDS for r in inter.user.roles)
+        return permissions.NINGUNO
+    return permisos.nivel(inter.user)
+
+def tiene_rol_admin(inter: discord.Interaction) -> bool:
+    return nivel_permisos(inter) >= permissions.ADMIN
 
 def tiene_rol_policia(inter: discord.Interaction) -> bool:
-    if not isinstance(inter.user, discord.Member):
-        return False
-    return any(r.id in POLICE_ROLE_IDS for r in inter.user.roles) or tiene_rol_admin(inter)
+    return nivel_permisos(inter) >= permissions.POLICIA
+
+def chequeo_trazado(fn):
+    def pred(inter: discord.Interaction) -> bool:
+        with tracing.etapa(inter, "permisos"):
+            return fn(inter)
+    return app_commands.check(pred)
 
 def solo_admin():
-    return app_commands.check(lambda inter: tiene_rol_admin(inter))
+    return chequeo_trazado(tiene_rol_admin)
 
 def solo_policia():
-    return app_commands.check(lambda inter: tiene_rol_policia(inter))
+    return chequeo_trazado(tiene_rol_policia)
+
+def solo_admin_o_administrador():
+    # Los administradores del servidor también, para no quedarse fuera al cambiar los roles
+    return chequeo_trazado(lambda inter: tiene_rol_admin(inter) or (
+        isinstance(inter.user, discord.Member) and inter.user.guild_permissions.administrator))
 
-# ───── Persistencia JSON ─────
+# ───── Persistencia (por servidor: diario + instantánea, o SQLite con STORAGE_BACKEND=sqlite) ─────
+# Ficheros globales de antes del particionado (JSON o storage.SQLITE_FILE):
+# se copian a la partición de LEGACY_GUILD_ID. Si existen y la variable no
+# está definida, el bot se niega a arrancar (ver el final del fichero).
 DNI_FILE   = "dni_data.json"
 ANTEC_FILE = "antecedentes_data.json"
-
-def load_json(path: str) -> dict:
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-def save_json(path: str, data: dict):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-dni_db   = load_json(DNI_FILE)
-antec_db = load_json(ANTEC_FILE)
+BORRADOS_FILE = "borrados_pendientes.json"
+LEGACY_GUILD_ID = int(os.getenv("LEGACY_GUILD_ID", 0)) or None
+
+writer      = BackgroundWriter()
+particiones = Particiones(writer, legacy_guild_id=LEGACY_GUILD_ID, legacy_files=(DNI_FILE, ANTEC_FILE),
+                          legacy_sqlite=storage.SQLITE_FILE)
+
+async def particion(interaction: discord.Interaction) -> Particion:
+    """Datos del servidor desde el que llega la interacción."""
+    with tracing.etapa(interaction, "datos"):
+        return await particiones.obtener(interaction.guild_id)
+
+async def leer_ficha(interaction: discord.Interaction, part: Particion, uid: str) -> tuple:
+    """DNI y antecedentes de ``uid``; con SQLite, consultas por clave en un hilo."""
+    with tracing.etapa(interaction, "datos"):
+        if isinstance(part.dni_store, storage.SqliteStore):
+            return await asyncio.to_thread(part.ficha, uid)
+        return part.ficha(uid)
+
+async def precargar():
+    """Carga por adelantado la partición del servidor principal, si se conoce."""
+    if LEGACY_GUILD_ID:
+        await particiones.obtener(LEGACY_GUILD_ID)
 
 # ───── Bot y sincronización ─────
-bot = commands.Bot(command_prefix="!", intents=discord.Intents.default())
+class DNITree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # También se llama para el autocompletado, que no se traza ni se difiere
+        if interaction.type is discord.InteractionType.application_command and interaction.command:
+            tracing.iniciar(interaction, interaction.command.qualified_name)
+        return True
+
+SYNC_FILE = "comandos_sync.sha256"  # huella del último árbol de comandos sincronizado
+
+def huella_comandos(tree: app_commands.CommandTree) -> str:
+    cmds = sorted((c.to_dict(tree) for c in tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(cmds, sort_keys=True, default=str).encode()).hexdigest()
+
+class DNIBot(commands.AutoShardedBot):
+    async def start(self, token: str, *, reconnect: bool = True):
+        # La partición principal se carga en un hilo mientras se hace el login HTTP
+        self._carga = asyncio.create_task(precargar())
+        await super().start(token, reconnect=reconnect)
+
+    async def setup_hook(self):
+        # Se ejecuta una sola vez, tras el login y antes de conectar al gateway
+        self.web = await webserver.keep_alive(salud, metrics.render)
+        t0 = time.perf_counter()
+        await self._carga
+        print(f"📂 Datos precargados en {time.perf_counter() - t0:.2f}s de espera ({len(particiones)} servidores)")
+        writer.start()
+        announcer.start()
+        borrados.start()
+        await self.sincronizar_comandos()
+        # Heroku para el dyno con SIGTERM: cerramos limpio para volcar los datos
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:  # Windows
+            pass
+
+    async def sincronizar_comandos(self):
+        """Sincroniza el árbol de comandos solo si cambió desde la última vez."""
+        huella = f"{self.application_id}:{huella_comandos(self.tree)}"
+        try:
+            with open(SYNC_FILE, "r", encoding="utf-8") as f:
+                anterior = f.read().strip()
+        except FileNotFoundError:
+            anterior = None
+        if huella == anterior:
+            return
+        await self.tree.sync()
+        with open(SYNC_FILE, "w", encoding="utf-8") as f:
+            f.write(huella)
+        print("🔄 Comandos sincronizados")
+
+    async def close(self):
+        await announcer.stop()
+        await borrados.stop()
+        if getattr(self, "web", None):
+            await self.web.cleanup()
+        await super().close()
+        await writer.stop()
+
+intents = discord.Intents.default()
+intents.members = MEMBERS_INTENT
+bot = DNIBot(command_prefix="!", intents=intents, tree_cls=DNITree)
+announcer = AnnounceDispatcher(bot, ANNOUNCE_CHANNEL_ID)
+borrados  = DeletionScheduler(bot, BORRADOS_FILE)
+
+# ───── Salud y métricas (/health, /metrics) ─────
+COMANDOS = metrics.Counter("dnibot_comandos_total", "Interacciones (comandos, modales, botones) por resultado.", ("comando", "resultado"))
+LATENCIA = metrics.Histogram("dnibot_comando_segundos", "Duración de las interacciones.", ("comando",))
+ETAPAS   = metrics.Histogram("dnibot_etapa_segundos", "Duración de cada etapa de una interacción.", ("comando", "etapa"))
+DIFERIDAS = metrics.Counter("dnibot_interacciones_diferidas_total", "Interacciones diferidas por acercarse al plazo de 3 s.", ("comando",))
+GUARDADO = metrics.Histogram("dnibot_guardado_segundos", "Duración de cada volcado a disco.")
+metrics.Gauge("dnibot_guardado_pendiente", "Claves pendientes de volcar.", lambda: writer.pending)
+metrics.Gauge("dnibot_anuncios_en_cola", "Anuncios de DNI en cola.", lambda: announcer.queue.qsize())
+metrics.Gauge("dnibot_anuncios_enviados_total", "DNIs anunciados en el canal.", lambda: announcer.sent, kind="counter")
+metrics.Gauge("dnibot_anuncios_fallidos_total", "DNIs que no se pudieron anunciar.", lambda: announcer.failed, kind="counter")
+metrics.Gauge("dnibot_borrados_pendientes", "DMs de DNI pendientes de borrar.", lambda: len(borrados))
+metrics.Gauge("dnibot_latencia_gateway_segundos", "Latencia del heartbeat con Discord.", lambda: bot.latency)
+metrics.Gauge("dnibot_ciudadanos", "DNIs en memoria.", lambda: sum(len(p.registry) for p in particiones))
+metrics.Gauge("dnibot_particiones", "Servidores con datos en memoria.", lambda: len(particiones))
+metrics.Gauge("dnibot_particiones_cargas_total", "Particiones cargadas desde disco.", lambda: particiones.cargas, kind="counter")
+metrics.Gauge("dnibot_particiones_descargas_total", "Particiones descargadas por memoria.", lambda: particiones.descargas, kind="counter")
+metrics.Gauge("dnibot_ficha_cache_aciertos_total", "Aciertos del caché de fichas.", lambda: ficha_cache.hits, kind="counter")
+metrics.Gauge("dnibot_ficha_cache_fallos_total", "Fallos del caché de fichas.", lambda: ficha_cache.misses, kind="counter")
+metrics.Gauge("dnibot_permisos_cache_aciertos_total", "Aciertos del caché de permisos.", lambda: permisos.aciertos, kind="counter")
+metrics.Gauge("dnibot_permisos_cache_fallos_total", "Fallos del caché de permisos.", lambda: permisos.fallos, kind="counter")
+writer.on_flush = GUARDADO.observe
+particiones.on_evict = lambda gid: ficha_cache.discard_where(lambda k: k[0] == gid)
+
+def salud():
+    conectado = bot.is_ready() and not bot.is_closed()
+    ultimo = writer.last_flush
+    return conectado, {
+        "gateway": conectado,
+        "latencia": None if bot.latency != bot.latency else round(bot.latency, 4),  # NaN antes de conectar
+        "ultimo_guardado": ultimo and datetime.datetime.fromtimestamp(ultimo[0], datetime.timezone.utc).isoformat(),
+        "guardado_pendiente": writer.pending > 0,
+    }
+
+def registrar_traza(t: tracing.Traza, resultado: str):
+    COMANDOS.inc(t.nombre, resultado)
+    LATENCIA.observe(t.fin, t.nombre)
+    for etapa, segundos in t.etapas.items():
+        ETAPAS.observe(segundos, t.nombre, etapa)
+    if t.diferida:
+        DIFERIDAS.inc(t.nombre)
+
+tracing.on_fin = registrar_traza
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    tracing.terminar(interaction, "ok")
 
 @bot.event
 async def on_ready():
-    await bot.tree.sync()
     print(f"✅ Bot activo como {bot.user}")
 
+# ───── Invalidación del caché de permisos ─────
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.roles != after.roles:
+        permisos.invalidar(after.guild.id, after.id)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    permisos.invalidar(member.guild.id, member.id)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    permisos.invalidar(role.guild.id)
+
 @bot.tree.error
 async def on_app_command_error(inter: discord.Interaction, error):
     if isinstance(error, app_commands.CheckFailure):
-        await inter.response.send_message("🚫 No tienes permiso para usar este comando.", ephemeral=True)
+        await tracing.responder(inter, "🚫 No tienes permiso para usar este comando.", ephemeral=True)
+        tracing.terminar(inter, "denegado")
     else:
+        tracing.terminar(inter, "error")
         raise error
 
+def anuncia_en(guild_id: int) -> bool:
+    """El canal de anuncios es de un servidor concreto: no se anuncian DNIs de otros."""
+    canal = bot.get_channel(ANNOUNCE_CHANNEL_ID)
+    return canal is not None and canal.guild.id == guild_id
+
+def embed_anuncio(user, data):
+    emb = discord.Embed(
+        title="🆕 Nuevo DNI registrado",
+        description=f"Usuario: {user.mention}",
+        color=0x2ECC71
+    )
+    for k in ["nombre","apellidos","dni","nacimiento","sexo","nacionalidad","expedicion","caducidad"]:
+        emb.add_field(name=k.capitalize(), value=data.get(k,"—"), inline=False)
+    return emb
+
 # ───── Modales ─────
+def datos_modal_dni(modal, part) -> dict:
+    """Valida los campos de CrearDNIModal/AñadirDNIModal (ValueError con el mensaje)."""
+    try:
+        sexo, nacio = re.split(r"[ ,]+", modal.sex_nat.value.strip().upper(), maxsplit=1)
+    except ValueError:
+        raise ValueError("❌ Formato: H/M ESP")
+    return validar_dni(modal.nombre.value, modal.apellidos.value, modal.dni.value, modal.nacimiento.value,
+                       sexo, nacio, existe=lambda d: part.registry.uid_for_dni(d) is not None)
+
 class CrearDNIModal(discord.ui.Modal, title="Registrar DNI"):
     nombre     = discord.ui.TextInput(label="Nombre", max_length=30)
     apellidos  = discord.ui.TextInput(label="Apellidos", max_length=60)
@@ -78,52 +285,21 @@ class CrearDNIModal(discord.ui.Modal, title="Registrar DNI"):
     nacimiento = discord.ui.TextInput(label="Nacimiento (DD/MM/AAAA)", min_length=10, max_length=10)
     sex_nat    = discord.ui.TextInput(label="Sexo y nacionalidad (H/M ESP)", placeholder="M ESP", max_length=7)
 
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
+        part = await particion(interaction)
         uid  = str(interaction.user.id)
-        nom  = self.nombre.value.strip()
-        ape  = self.apellidos.value.strip()
-        dni_ = self.dni.value.strip().upper()
-        nac  = self.nacimiento.value.strip()
         try:
-            sexo, nacio = re.split(r"[ ,]+", self.sex_nat.value.strip().upper(), maxsplit=1)
-        except ValueError:
-            return await interaction.response.send_message("❌ Formato: H/M ESP", ephemeral=True)
-
-        data = {
-            "nombre":       nom,
-            "apellidos":    ape,
-            "dni":          dni_,
-            "nacimiento":   nac,
-            "sexo":         sexo,
-            "nacionalidad": nacio,
-            "expedicion":   datetime.date.today().strftime("%d/%m/%Y"),
-            "caducidad":    datetime.date.today().replace(year=datetime.date.today().year + 10).strftime("%d/%m/%Y")
-        }
-
-        if not re.fullmatch(r"\d{9}[A-Z]", data["dni"]):
-            return await interaction.response.send_message("❌ DNI inválido.", ephemeral=True)
-        if sexo not in {"H", "M"}:
-            return await interaction.response.send_message("❌ Sexo debe ser H o M.", ephemeral=True)
-        if not re.fullmatch(r"[A-Z]{3}", data["nacionalidad"]):
-            return await interaction.response.send_message("❌ Nacionalidad debe ser 3 letras.", ephemeral=True)
-        for rec in dni_db.values():
-            if rec["dni"] == data["dni"]:
-                return await interaction.response.send_message("❌ Ese DNI ya existe.", ephemeral=True)
-
-        dni_db[uid] = data
-        save_json(DNI_FILE, dni_db)
-        await interaction.response.send_message("✅ DNI registrado.", ephemeral=True)
-
-        canal = interaction.client.get_channel(ANNOUNCE_CHANNEL_ID)
-        if canal:
-            emb = discord.Embed(
-                title="🆕 Nuevo DNI registrado",
-                description=f"Usuario: {interaction.user.mention}",
-                color=0x2ECC71
-            )
-            for k in ["nombre","apellidos","dni","nacimiento","sexo","nacionalidad","expedicion","caducidad"]:
-                emb.add_field(name=k.capitalize(), value=data.get(k,"—"), inline=False)
-            await canal.send(embed=emb)
+            data = datos_modal_dni(self, part)
+        except ValueError as e:
+            return await tracing.responder(interaction, str(e), ephemeral=True)
+
+        with tracing.etapa(interaction, "datos"):
+            part.registry.add(uid, DNI.from_json(data))
+            invalidar_ficha(part, uid)
+        await tracing.responder(interaction, "✅ DNI registrado.", ephemeral=True)
+        if anuncia_en(interaction.guild_id):
+            announcer.enqueue(embed_anuncio(interaction.user, data))
 
 class AñadirDNIModal(discord.ui.Modal, title="Registrar DNI para usuario"):
     nombre     = discord.ui.TextInput(label="Nombre", max_length=30)
@@ -137,49 +313,20 @@ class AñadirDNIModal(discord.ui.Modal, title="Registrar DNI para usuario"):
         self.target = target
         self.uid    = str(target.id)
 
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
-        nom, ape = self.nombre.value.strip(), self.apellidos.value.strip()
-        dni_, nac = self.dni.value.strip().upper(), self.nacimiento.value.strip()
+        part = await particion(interaction)
         try:
-            sexo, nacio = re.split(r"[ ,]+", self.sex_nat.value.strip().upper(), maxsplit=1)
-        except ValueError:
-            return await interaction.response.send_message("❌ Formato: H/M ESP", ephemeral=True)
-
-        data = {
-            "nombre":       nom,
-            "apellidos":    ape,
-            "dni":          dni_,
-            "nacimiento":   nac,
-            "sexo":         sexo,
-            "nacionalidad": nacio,
-            "expedicion":   datetime.date.today().strftime("%d/%m/%Y"),
-            "caducidad":    datetime.date.today().replace(year=datetime.date.today().year + 10).strftime("%d/%m/%Y")
-        }
-
-        if not re.fullmatch(r"\d{9}[A-Z]", data["dni"]):
-            return await interaction.response.send_message("❌ DNI inválido.", ephemeral=True)
-        if sexo not in {"H", "M"}:
-            return await interaction.response.send_message("❌ Sexo debe ser H o M.", ephemeral=True)
-        if not re.fullmatch(r"[A-Z]{3}", data["nacionalidad"]):
-            return await interaction.response.send_message("❌ Nacionalidad debe ser 3 letras.", ephemeral=True)
-        for rec in dni_db.values():
-            if rec["dni"] == data["dni"]:
-                return await interaction.response.send_message("❌ Ese DNI ya existe.", ephemeral=True)
-
-        dni_db[self.uid] = data
-        save_json(DNI_FILE, dni_db)
-        await interaction.response.send_message(f"✅ DNI registrado para {self.target.mention}.", ephemeral=True)
-
-        canal = interaction.client.get_channel(ANNOUNCE_CHANNEL_ID)
-        if canal:
-            emb = discord.Embed(
-                title="🆕 Nuevo DNI registrado",
-                description=f"Usuario: {self.target.mention}",
-                color=0x2ECC71
-            )
-            for k in ["nombre","apellidos","dni","nacimiento","sexo","nacionalidad","expedicion","caducidad"]:
-                emb.add_field(name=k.capitalize(), value=data.get(k,"—"), inline=False)
-            await canal.send(embed=emb)
+            data = datos_modal_dni(self, part)
+        except ValueError as e:
+            return await tracing.responder(interaction, str(e), ephemeral=True)
+
+        with tracing.etapa(interaction, "datos"):
+            part.registry.add(self.uid, DNI.from_json(data))
+            invalidar_ficha(part, self.uid)
+        await tracing.responder(interaction, f"✅ DNI registrado para {self.target.mention}.", ephemeral=True)
+        if anuncia_en(interaction.guild_id):
+            announcer.enqueue(embed_anuncio(self.target, data))
 
 class CrearAntecedenteModal(discord.ui.Modal, title="Registrar antecedente"):
     tipo        = discord.ui.TextInput(label="Tipo", max_length=50)
@@ -187,128 +334,182 @@ class CrearAntecedenteModal(discord.ui.Modal, title="Registrar antecedente"):
     descripcion = discord.ui.TextInput(label="Descripción", style=discord.TextStyle.paragraph, max_length=200)
     def __init__(self, uid: int):
         super().__init__(); self.uid = str(uid)
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
-        lst = antec_db.setdefault(self.uid, [])
-        lst.append({
-            "id":           len(lst) + 1,
-            "tipo":         self.tipo.value.strip(),
-            "fecha":        self.fecha.value.strip(),
-            "descripcion":  self.descripcion.value.strip()
-        })
-        save_json(ANTEC_FILE, antec_db)
-        await interaction.response.send_message("✅ Antecedente registrado.", ephemeral=True)
+        try:
+            campos = validar_antecedente(self.tipo.value, self.fecha.value, self.descripcion.value)
+        except ValueError as e:
+            return await tracing.responder(interaction, str(e), ephemeral=True)
+        part = await particion(interaction)
+        ants = part.antec_db.get(self.uid)
+        if ants is None:
+            ants = Antecedentes()
+        with tracing.etapa(interaction, "datos"):
+            a = ants.add(*campos)
+            part.antec_store.set(self.uid, ants)
+            part.antec_index.add(self.uid, a)
+            invalidar_ficha(part, self.uid)
+        await tracing.responder(interaction, "✅ Antecedente registrado.", ephemeral=True)
 
 class ResetDNIModal(discord.ui.Modal, title="Eliminar DNI"):
     motivo = discord.ui.TextInput(label="Motivo", style=discord.TextStyle.paragraph, max_length=200)
     def __init__(self, target: discord.Member):
         super().__init__(); self.target,self.uid = target,str(target.id)
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
-        if self.uid in dni_db:
-            del dni_db[self.uid]; save_json(DNI_FILE, dni_db)
+        part = await particion(interaction)
+        with tracing.etapa(interaction, "datos"):
+            borrado = part.registry.remove(self.uid)
+        if borrado:
+            invalidar_ficha(part, self.uid)
+            await tracing.responder(interaction, "✅ DNI eliminado.", ephemeral=True)
             try: await self.target.send(f"❗ Tu DNI ha sido eliminado.\nMotivo: {self.motivo.value}")
             except: pass
-            await interaction.response.send_message("✅ DNI eliminado.", ephemeral=True)
         else:
-            await interaction.response.send_message("❌ Ese usuario no tiene DNI.", ephemeral=True)
+            await tracing.responder(interaction, "❌ Ese usuario no tiene DNI.", ephemeral=True)
 
 class QuitarTodosModal(discord.ui.Modal, title="Eliminar TODOS los antecedentes"):
     motivo = discord.ui.TextInput(label="Motivo", style=discord.TextStyle.paragraph, max_length=200)
     def __init__(self, target: discord.Member):
         super().__init__(); self.target,self.uid = target,str(target.id)
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
-        if self.uid in antec_db:
-            del antec_db[self.uid]; save_json(ANTEC_FILE, antec_db)
+        part = await particion(interaction)
+        ants = part.antec_db.get(self.uid)
+        if ants:
+            with tracing.etapa(interaction, "datos"):
+                part.antec_index.remove_all(self.uid, ants)
+                ants.clear(); part.antec_store.set(self.uid, ants); invalidar_ficha(part, self.uid)
+            await tracing.responder(interaction, "✅ Antecedentes eliminados.", ephemeral=True)
             try: await self.target.send(f"❗ Tus antecedentes han sido eliminados.\nMotivo: {self.motivo.value}")
             except: pass
-            await interaction.response.send_message("✅ Antecedentes eliminados.", ephemeral=True)
         else:
-            await interaction.response.send_message("❌ Ese usuario no tiene antecedentes.", ephemeral=True)
+            await tracing.responder(interaction, "❌ Ese usuario no tiene antecedentes.", ephemeral=True)
 
 class QuitarUnoModal(discord.ui.Modal, title="Eliminar un antecedente"):
-    antecedente_id = discord.ui.TextInput(label="ID", max_length=4)
+    antecedente_id = discord.ui.TextInput(label="ID", max_length=6)
     motivo         = discord.ui.TextInput(label="Motivo", style=discord.TextStyle.paragraph, max_length=200)
     def __init__(self, target: discord.Member):
         super().__init__(); self.target,self.uid = target,str(target.id)
+    @tracing.trazado()
     async def on_submit(self, interaction: discord.Interaction):
-        lst = antec_db.get(self.uid, [])
+        part = await particion(interaction)
+        ants = part.antec_db.get(self.uid)
         try: aid=int(self.antecedente_id.value)
-        except: return await interaction.response.send_message("❌ ID inválido.", ephemeral=True)
-        idx = next((i for i,a in enumerate(lst) if a["id"]==aid), None)
-        if idx is None:
-            return await interaction.response.send_message("❌ ID no existe.", ephemeral=True)
-        lst.pop(idx)
-        for i,a in enumerate(lst,1): a["id"]=i
-        if lst: antec_db[self.uid]=lst
-        else:   del antec_db[self.uid]
-        save_json(ANTEC_FILE, antec_db)
+        except: return await tracing.responder(interaction, "❌ ID inválido.", ephemeral=True)
+        a = ants.remove(aid) if ants is not None else None
+        if a is None:
+            return await tracing.responder(interaction, "❌ ID no existe.", ephemeral=True)
+        with tracing.etapa(interaction, "datos"):
+            part.antec_store.set(self.uid, ants)
+            part.antec_index.remove(self.uid, a)
+            invalidar_ficha(part, self.uid)
+        await tracing.responder(interaction, f"✅ Antecedente #{aid} eliminado.", ephemeral=True)
         try: await self.target.send(f"❗ Antecedente #{aid} eliminado.\nMotivo: {self.motivo.value}")
         except: pass
-        await interaction.response.send_message(f"✅ Antecedente #{aid} eliminado.", ephemeral=True)
 
 class ShareDNIView(discord.ui.View):
-    def __init__(self, requester: discord.Member, target: discord.Member, tiempo: int):
+    def __init__(self, requester: discord.Member, target: discord.Member, tiempo: int, guild_id: int):
         super().__init__(timeout=300)
         self.requester = requester
         self.target    = target
         self.tiempo    = tiempo
+        self.guild_id  = guild_id
 
     @discord.ui.button(label="Aceptar", style=discord.ButtonStyle.success)
+    @tracing.trazado()
     async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.target.id:
-            return await interaction.response.send_message("🚫 Solo el destinatario puede aceptar.", ephemeral=True)
-        rec = dni_db.get(str(self.target.id))
+            return await tracing.responder(interaction, "🚫 Solo el destinatario puede aceptar.", ephemeral=True)
+        with tracing.etapa(interaction, "datos"):
+            part = await particiones.obtener(self.guild_id)
+            rec = part.registry.get(str(self.target.id))
         if not rec:
-            return await interaction.response.send_message("❌ El usuario no tiene DNI.", ephemeral=True)
+            return await tracing.responder(interaction, "❌ El usuario no tiene DNI.", ephemeral=True)
         dm = self.requester.dm_channel or await self.requester.create_dm()
         emb = discord.Embed(title=f"🔒 DNI de {self.target.display_name}", color=0x2ECC71)
+        datos = rec.to_json()
         for k in ["nombre","apellidos","dni","nacimiento","sexo","nacionalidad","expedicion","caducidad"]:
-            emb.add_field(name=k.capitalize(), value=rec.get(k,"—"), inline=False)
+            emb.add_field(name=k.capitalize(), value=datos.get(k) or "—", inline=False)
         msg = await dm.send(embed=emb)
-        async def cleanup():
-            await asyncio.sleep(self.tiempo)
-            try: await msg.delete()
-            except: pass
-        asyncio.create_task(cleanup())
-        await interaction.response.send_message("✅ Has aceptado. DNI enviado y se borrará tras el tiempo indicado.", ephemeral=True)
+        await borrados.schedule(msg, self.tiempo)
+        await tracing.responder(interaction, "✅ Has aceptado. DNI enviado y se borrará tras el tiempo indicado.", ephemeral=True)
         self.stop()
 
     @discord.ui.button(label="Rechazar", style=discord.ButtonStyle.secondary)
+    @tracing.trazado()
     async def reject(self, interaction: discord.Interaction, button: discord.ui.Button):
         if interaction.user.id != self.target.id:
-            return await interaction.response.send_message("🚫 Solo el destinatario puede rechazar.", ephemeral=True)
-        await interaction.response.send_message("❌ Has rechazado la solicitud.", ephemeral=True)
+            return await tracing.responder(interaction, "🚫 Solo el destinatario puede rechazar.", ephemeral=True)
+        await tracing.responder(interaction, "❌ Has rechazado la solicitud.", ephemeral=True)
         self.stop()
 
 ANT_PAG = 5
+FICHA_CACHE_SIZE = 512  # páginas de ficha ya renderizadas que se conservan
+
+# La versión de la ficha de cada usuario (Particion.ficha_version) forma
+# parte de la clave del caché, así que cambiarla deja obsoletas sus páginas
+# renderizadas. Las versiones salen de un contador global para que no se
+# repitan al volver a cargar una partición descargada.
+ficha_cache = LRUCache(FICHA_CACHE_SIZE)
+ficha_versiones = itertools.count(1)
+
+def invalidar_ficha(part, uid: str):
+    part.ficha_version[uid] = next(ficha_versiones)
+    ficha_cache.discard_where(lambda k: k[:2] == (part.guild_id, uid))
 
 def embed_ficha(user, rec, ants, page):
     emb = discord.Embed(title=f"🗂️ Ficha policial de {user.display_name}", color=0xE74C3C)
-    emb.add_field(name="Nombre",       value=rec["nombre"],       inline=False)
-    emb.add_field(name="Apellidos",    value=rec["apellidos"],    inline=False)
-    emb.add_field(name="DNI",          value=rec["dni"],          inline=False)
-    emb.add_field(name="Nacimiento",   value=rec.get("nacimiento","—"),   inline=False)
-    emb.add_field(name="Nacionalidad", value=rec.get("nacionalidad","—"), inline=False)
-    emb.add_field(name="Sexo",         value=rec.get("sexo","—"),         inline=False)
-    emb.add_field(name="Expedición",   value=rec.get("expedicion","—"),   inline=False)
-    emb.add_field(name="Caducidad",    value=rec.get("caducidad","—"),    inline=False)
+    d = rec.to_json()
+    emb.add_field(name="Nombre",       value=d["nombre"],       inline=False)
+    emb.add_field(name="Apellidos",    value=d["apellidos"],    inline=False)
+    emb.add_field(name="DNI",          value=d["dni"],          inline=False)
+    emb.add_field(name="Nacimiento",   value=d["nacimiento"] or "—",   inline=False)
+    emb.add_field(name="Nacionalidad", value=d["nacionalidad"] or "—", inline=False)
+    emb.add_field(name="Sexo",         value=d["sexo"] or "—",         inline=False)
+    emb.add_field(name="Expedición",   value=d["expedicion"] or "—",   inline=False)
+    emb.add_field(name="Caducidad",    value=d["caducidad"] or "—",    inline=False)
     if not ants:
         emb.add_field(name="Antecedentes", value="Sin antecedentes.", inline=False)
     else:
-        seg = ants[page*ANT_PAG:(page+1)*ANT_PAG]
-        for a in seg:
+        for a in ants.page(page, ANT_PAG):
             emb.add_field(
-                name=f"#{a['id']} • {a['tipo']} • {a['fecha']}",
-                value=a["descripcion"] or "—", inline=False
+                name=f"#{a.id} • {a.tipo} • {a.fecha_texto}",
+                value=a.descripcion or "—", inline=False
             )
         emb.set_footer(text=f"Página {page+1}/{(len(ants)-1)//ANT_PAG+1}")
     return emb
 
-class PaginaView(discord.ui.View):
-    def __init__(self, user, rec, ants, req_id):
+def ficha_pagina(part, user, rec, ants, page, version):
+    """``embed_ficha`` con caché por (servidor, usuario, versión, página, nombre visible).
+
+    ``version`` es la de la ficha cuando se leyeron ``rec`` y ``ants``; si ya
+    cambió, la página se renderiza sin cachear.
+    """
+    uid = str(user.id)
+    if version != part.ficha_version.get(uid, 0):
+        return embed_ficha(user, rec, ants, page)
+    key = (part.guild_id, uid, version, page, user.display_name)
+    emb = ficha_cache.get(key)
+    if emb is None:
+        emb = embed_ficha(user, rec, ants, page)
+        ficha_cache.put(key, emb)
+    return emb
+
+class Paginador(discord.ui.View):
+    """Botones ◀/▶ sobre ``total`` páginas; solo los usa quien lo pidió.
+
+    ``render(part, page)`` devuelve el embed de cada página con la partición
+    resuelta en ese momento.
+    """
+
+    def __init__(self, total, req_id, render, ajeno="🚫 No puedes navegar esta ficha."):
         super().__init__(timeout=180)
-        self.user, self.rec, self.ants, self.req = user, rec, ants, req_id
+        self.req = req_id
         self.page = 0
-        self.total = (len(ants)-1)//ANT_PAG+1
+        self.total = total
+        self.render = render
+        self.ajeno = ajeno
         self._update_buttons()
 
     def _update_buttons(self):
@@ -317,49 +518,80 @@ class PaginaView(discord.ui.View):
 
     async def _flip(self, interaction: discord.Interaction, step: int):
         if interaction.user.id != self.req:
-            return await interaction.response.send_message("🚫 No puedes navegar esta ficha.", ephemeral=True)
+            return await tracing.responder(interaction, self.ajeno, ephemeral=True)
         self.page += step
         self._update_buttons()
-        await interaction.response.edit_message(embed=embed_ficha(self.user,self.rec,self.ants,self.page), view=self)
+        part = await particion(interaction)  # la de la vista puede haberse descargado
+        with tracing.etapa(interaction, "render"):
+            emb = self.render(part, self.page)
+        await tracing.editar(interaction, embed=emb, view=self)
 
     @discord.ui.button(label="◀ Atrás", style=discord.ButtonStyle.secondary)
+    @tracing.trazado(edita=True)
     async def prev(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._flip(interaction, -1)
 
     @discord.ui.button(label="Siguiente ▶", style=discord.ButtonStyle.secondary)
+    @tracing.trazado(edita=True)
     async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._flip(interaction, 1)
 
+# ───── Búsqueda de antecedentes ─────
+RES_PAG = 10
+
+def embed_resultados(part, claves, filtros, page):
+    lineas = []
+    for uid, aid in claves[page*RES_PAG:(page+1)*RES_PAG]:
+        ants = part.antec_db.get(uid)
+        a = ants.get(aid) if ants is not None else None
+        if a is None:  # borrado después de la búsqueda
+            lineas.append(f"• ~~#{aid}~~ — <@{uid}> — (eliminado)")
+            continue
+        desc = a.descripcion or "—"
+        lineas.append(f"• **#{a.id} {a.tipo}** • {a.fecha_texto} — <@{uid}>\n  {desc[:90] + '…' if len(desc) > 90 else desc}")
+    emb = discord.Embed(title=f"🔎 {len(claves)} antecedentes", description="\n".join(lineas), color=0xE74C3C)
+    emb.set_footer(text=f"{filtros} • Página {page+1}/{(len(claves)-1)//RES_PAG+1}")
+    return emb
+
 # ───── Slash-commands ─────
 @bot.tree.command(name="creardni", description="Crea tu DNI completo.")
+@app_commands.guild_only()
 async def creardni(interaction: discord.Interaction):
-    if str(interaction.user.id) in dni_db:
-        return await interaction.response.send_message("Ya tienes DNI. Usa /verdni.", ephemeral=True)
-    await interaction.response.send_modal(CrearDNIModal())
+    part = await particion(interaction)
+    if str(interaction.user.id) in part.registry:
+        return await tracing.responder(interaction, "Ya tienes DNI. Usa /verdni.", ephemeral=True)
+    await tracing.abrir_modal(interaction, CrearDNIModal())
 
 @solo_admin()
 @bot.tree.command(name="añadirdni", description="Añade DNI a otro usuario.")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario destinatario del DNI")
 async def anadirdni(interaction: discord.Interaction, usuario: discord.Member):
-    if str(usuario.id) in dni_db:
-        return await interaction.response.send_message("❌ Ese usuario ya tiene DNI. Usa /verdni.", ephemeral=True)
-    await interaction.response.send_modal(AñadirDNIModal(usuario))
+    part = await particion(interaction)
+    if str(usuario.id) in part.registry:
+        return await tracing.responder(interaction, "❌ Ese usuario ya tiene DNI. Usa /verdni.", ephemeral=True)
+    await tracing.abrir_modal(interaction, AñadirDNIModal(usuario))
 
 @bot.tree.command(name="verdni", description="Muestra tu DNI completo.")
+@app_commands.guild_only()
 async def verdni(interaction: discord.Interaction):
-    rec = dni_db.get(str(interaction.user.id))
+    part = await particion(interaction)
+    rec, _ = await leer_ficha(interaction, part, str(interaction.user.id))
     if not rec:
-        return await interaction.response.send_message("❌ No tienes DNI.", ephemeral=True)
-    emb = discord.Embed(title="🔎 Tu DNI", color=0x3498DB)
-    for k in ["nombre","apellidos","dni","nacimiento","nacionalidad","sexo","expedicion","caducidad"]:
-        emb.add_field(name=k.capitalize(), value=rec.get(k,"—"), inline=False)
-    await interaction.response.send_message(embed=emb, ephemeral=True)
+        return await tracing.responder(interaction, "❌ No tienes DNI.", ephemeral=True)
+    with tracing.etapa(interaction, "render"):
+        emb = discord.Embed(title="🔎 Tu DNI", color=0x3498DB)
+        datos = rec.to_json()
+        for k in ["nombre","apellidos","dni","nacimiento","nacionalidad","sexo","expedicion","caducidad"]:
+            emb.add_field(name=k.capitalize(), value=datos.get(k) or "—", inline=False)
+    await tracing.responder(interaction, embed=emb, ephemeral=True)
 
 @solo_policia()
 @bot.tree.command(name="crearantecedentes", description="Registrar antecedente.")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario afectado")
 async def crearantecedentes(interaction: discord.Interaction, usuario: discord.Member):
-    await interaction.response.send_modal(CrearAntecedenteModal(usuario.id))
+    await tracing.abrir_modal(interaction, CrearAntecedenteModal(usuario.id))
 
 @solo_admin()
 @app_commands.choices(
@@ -367,46 +599,134 @@ async def crearantecedentes(interaction: discord.Interaction, usuario: discord.M
                   app_commands.Choice(name="No", value="No")]
 )
 @bot.tree.command(name="quitarantecedentes", description="Eliminar antecedente(s).")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario afectado", quitar_todos='Elige "Si" para borrar todos')
 async def quitarantecedentes(interaction: discord.Interaction, usuario: discord.Member, quitar_todos: app_commands.Choice[str]):
     if quitar_todos.value == "Si":
-        await interaction.response.send_modal(QuitarTodosModal(usuario))
+        await tracing.abrir_modal(interaction, QuitarTodosModal(usuario))
     else:
-        await interaction.response.send_modal(QuitarUnoModal(usuario))
+        await tracing.abrir_modal(interaction, QuitarUnoModal(usuario))
 
 @solo_admin()
 @bot.tree.command(name="reseteardni", description="Eliminar DNI de un usuario.")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario cuyo DNI eliminarás")
 async def reseteardni(interaction: discord.Interaction, usuario: discord.Member):
-    await interaction.response.send_modal(ResetDNIModal(usuario))
+    await tracing.abrir_modal(interaction, ResetDNIModal(usuario))
 
 @solo_policia()
 @bot.tree.command(name="fichapolicia", description="Ficha policial de un usuario.")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario a consultar")
 async def fichapolicia(interaction: discord.Interaction, usuario: discord.Member):
-    rec = dni_db.get(str(usuario.id))
+    part = await particion(interaction)
+    version = part.ficha_version.get(str(usuario.id), 0)  # antes de leer: si cambia entretanto, no se cachea
+    rec, ants = await leer_ficha(interaction, part, str(usuario.id))
     if not rec:
-        return await interaction.response.send_message(f"❌ {usuario.display_name} no tiene DNI.", ephemeral=True)
-    ants = antec_db.get(str(usuario.id), [])
-    emb = embed_ficha(usuario, rec, ants, 0)
+        return await tracing.responder(interaction, f"❌ {usuario.display_name} no tiene DNI.", ephemeral=True)
+    ants = ants or Antecedentes()
+    with tracing.etapa(interaction, "render"):
+        emb = ficha_pagina(part, usuario, rec, ants, 0, version)
     if len(ants) > ANT_PAG:
-        view = PaginaView(usuario, rec, ants, interaction.user.id)
-        await interaction.response.send_message(embed=emb, view=view, ephemeral=True)
+        view = Paginador((len(ants)-1)//ANT_PAG+1, interaction.user.id,
+                         lambda p, page: ficha_pagina(p, usuario, rec, ants, page, version))
+        await tracing.responder(interaction, embed=emb, view=view, ephemeral=True)
     else:
-        await interaction.response.send_message(embed=emb, ephemeral=True)
+        await tracing.responder(interaction, embed=emb, ephemeral=True)
 
 @solo_policia()
 @bot.tree.command(name="fichapolicial", description="Alias para /fichapolicia")
+@app_commands.guild_only()
 @app_commands.describe(usuario="Usuario a consultar")
 async def fichapolicial(interaction: discord.Interaction, usuario: discord.Member):
-    await fichapolicia(interaction, usuario)
+    await fichapolicia.callback(interaction, usuario)
+
+@solo_policia()
+@bot.tree.command(name="buscardni", description="Buscar un ciudadano por DNI, nombre o apellidos.")
+@app_commands.guild_only()
+@app_commands.describe(consulta="Número de DNI o nombre/apellidos")
+async def buscardni(interaction: discord.Interaction, consulta: str):
+    part = await particion(interaction)
+    consulta = consulta.strip()
+    with tracing.etapa(interaction, "datos"):
+        uid = part.registry.uid_for_dni(consulta.upper())
+        uids = [uid] if uid else part.registry.search(consulta)
+    if not uids:
+        return await tracing.responder(interaction, "❌ No se ha encontrado ningún DNI.", ephemeral=True)
+    if len(uids) > 1:
+        with tracing.etapa(interaction, "render"):
+            recs = [(u, part.registry.get(u)) for u in uids]
+            lineas = [f"• {r.apellidos}, {r.nombre} — `{r.dni}` — <@{u}>" for u, r in recs]
+            emb = discord.Embed(title=f"🔎 {len(uids)} coincidencias", description="\n".join(lineas), color=0x3498DB)
+        return await tracing.responder(interaction, embed=emb, ephemeral=True)
+    rec = part.registry.get(uids[0])
+    with tracing.etapa(interaction, "render"):
+        emb = discord.Embed(title="🔎 DNI encontrado", description=f"Usuario: <@{uids[0]}>", color=0x3498DB)
+        datos = rec.to_json()
+        for k in ["nombre","apellidos","dni","nacimiento","nacionalidad","sexo","expedicion","caducidad"]:
+            emb.add_field(name=k.capitalize(), value=datos.get(k) or "—", inline=False)
+    await tracing.responder(interaction, embed=emb, ephemeral=True)
+
+@buscardni.autocomplete("consulta")
+async def buscardni_autocomplete(interaction: discord.Interaction, actual: str):
+    if not tiene_rol_policia(interaction):
+        return []
+    part = await particion(interaction)
+    uid = part.registry.uid_for_dni(actual.strip().upper())
+    uids = [uid] if uid else part.registry.search(actual)
+    recs = [part.registry.get(u) for u in uids]
+    return [app_commands.Choice(name=f"{r.apellidos}, {r.nombre} — {r.dni}"[:100], value=r.dni) for r in recs]
+
+@solo_policia()
+@bot.tree.command(name="buscarantecedentes", description="Buscar antecedentes por tipo, fechas o texto de la descripción.")
+@app_commands.guild_only()
+@app_commands.describe(
+    tipo="Tipo de antecedente (p. ej. Robo)",
+    texto="Palabras que aparecen en la descripción",
+    desde="Desde DD/MM/AAAA, o MM/AAAA para todo el mes",
+    hasta="Hasta DD/MM/AAAA, o MM/AAAA para todo el mes",
+)
+async def buscarantecedentes(interaction: discord.Interaction, tipo: str = None, texto: str = None,
+                             desde: str = None, hasta: str = None):
+    ini = fecha_consulta(desde) if desde else None
+    fin = fecha_consulta(hasta, fin=True) if hasta else None
+    if (desde and ini is None) or (hasta and fin is None):
+        return await tracing.responder(interaction, "❌ Fecha inválida: usa DD/MM/AAAA o MM/AAAA.", ephemeral=True)
+    if not (tipo or texto or desde or hasta):
+        return await tracing.responder(interaction, "❌ Indica al menos un filtro.", ephemeral=True)
+    part = await particion(interaction)
+    with tracing.etapa(interaction, "datos"):
+        claves = part.antec_index.buscar(tipo=tipo, texto=texto, desde=ini, hasta=fin)
+    if not claves:
+        return await tracing.responder(interaction, "❌ No se ha encontrado ningún antecedente.", ephemeral=True)
+    filtros = " • ".join(f"{k}: {v}" for k, v in (("tipo", tipo), ("texto", texto), ("desde", desde), ("hasta", hasta)) if v)
+    with tracing.etapa(interaction, "render"):
+        emb = embed_resultados(part, claves, filtros, 0)
+    if len(claves) > RES_PAG:
+        view = Paginador((len(claves)-1)//RES_PAG+1, interaction.user.id,
+                         lambda p, page: embed_resultados(p, claves, filtros, page),
+                         ajeno="🚫 No puedes navegar esta búsqueda.")
+        await tracing.responder(interaction, embed=emb, view=view, ephemeral=True)
+    else:
+        await tracing.responder(interaction, embed=emb, ephemeral=True)
+
+@buscarantecedentes.autocomplete("tipo")
+async def buscarantecedentes_tipo(interaction: discord.Interaction, actual: str):
+    if not tiene_rol_policia(interaction):
+        return []
+    part = await particion(interaction)
+    actual = normalizar(actual.strip())
+    tipos = sorted(v for k, v in part.antec_index.tipos.items() if k.startswith(actual))
+    return [app_commands.Choice(name=t[:100], value=t[:100]) for t in tipos[:25]]
 
 @bot.tree.command(name="ensenardni", description="Solicitar permiso para ver el DNI de un usuario.")
-@app_commands.describe(usuario="Usuario dueño del DNI", tiempo="Segundos que durará el DM antes de borrarse")
-async def ensenardni(interaction: discord.Interaction, usuario: discord.Member, tiempo: int):
-    if str(usuario.id) not in dni_db:
-        return await interaction.response.send_message("❌ Ese usuario no tiene DNI.", ephemeral=True)
-    await interaction.response.send_message(f"📨 Solicitud enviada a {usuario.display_name}.", ephemeral=True)
+@app_commands.guild_only()
+@app_commands.describe(usuario="Usuario dueño del DNI", tiempo=f"Segundos que durará el DM antes de borrarse (máx. {MAX_RETENCION})")
+async def ensenardni(interaction: discord.Interaction, usuario: discord.Member, tiempo: app_commands.Range[int, 1, MAX_RETENCION]):
+    part = await particion(interaction)
+    if str(usuario.id) not in part.registry:
+        return await tracing.responder(interaction, "❌ Ese usuario no tiene DNI.", ephemeral=True)
+    await tracing.responder(interaction, f"📨 Solicitud enviada a {usuario.display_name}.", ephemeral=True)
     dm = usuario.dm_channel or await usuario.create_dm()
     emb = discord.Embed(
         title="🔔 Solicitud de DNI",
@@ -416,10 +736,134 @@ async def ensenardni(interaction: discord.Interaction, usuario: discord.Member,
         ),
         color=0xF1C40F
     )
-    view = ShareDNIView(requester=interaction.user, target=usuario, tiempo=tiempo)
+    view = ShareDNIView(requester=interaction.user, target=usuario, tiempo=tiempo, guild_id=interaction.guild_id)
     await dm.send(embed=emb, view=view)
 
+@solo_admin()
+@bot.tree.command(name="migrarjson", description="Importa los ficheros JSON de este servidor a SQLite.")
+@app_commands.guild_only()
+async def migrarjson(interaction: discord.Interaction):
+    async with particiones.usar(interaction.guild_id) as part:
+        if not isinstance(part.dni_store, storage.SqliteStore):
+            return await tracing.responder(interaction, "❌ El bot no está usando SQLite (STORAGE_BACKEND=sqlite).", ephemeral=True)
+        await tracing.diferir(interaction, ephemeral=True, thinking=True)
+        await writer.flush()
+        dni_path, antec_path = (os.path.join(part.dir, f) for f in (partitions.DNI_FILE, partitions.ANTEC_FILE))
+        try:
+            dnis, ants, conflictos = await asyncio.to_thread(part.dni_store.db.import_json, dni_path, antec_path)
+        except Exception as e:
+            return await tracing.responder(interaction, f"❌ Error en la migración, no se ha importado nada: {e}", ephemeral=True)
+        part.dni_store.data.update((k, part.dni_store.decode(v)) for k, v in dnis.items())
+        part.antec_store.data.update((k, part.antec_store.decode(v)) for k, v in ants.items())
+        part.registry.rebuild()
+        part.antec_index.rebuild()
+        ficha_cache.discard_where(lambda k: k[0] == part.guild_id)
+        msg = f"✅ Migrados {len(dnis)} DNIs y {sum(len(part.antec_db[k]) for k in ants)} antecedentes."
+        if conflictos:
+            msg += f"\n⚠️ {len(conflictos)} DNIs no migrados porque el número ya es de otro usuario:\n"
+            msg += "\n".join(f"- <@{uid}>: {dni}" for uid, dni in conflictos[:20])
+            if len(conflictos) > 20:
+                msg += f"\n... y {len(conflictos) - 20} más."
+        await tracing.responder(interaction, msg, ephemeral=True)
+
+DATOS_MASIVOS = [app_commands.Choice(name="DNIs", value="dnis"),
+                 app_commands.Choice(name="Antecedentes", value="antecedentes")]
+
+def fichero_temporal(sufijo: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="dnibot-", suffix=sufijo)
+    os.close(fd)
+    return path
+
+@solo_admin()
+@app_commands.choices(datos=DATOS_MASIVOS)
+@bot.tree.command(name="importar", description="Importa DNIs o antecedentes desde un CSV o JSONL.")
+@app_commands.guild_only()
+@app_commands.describe(datos="Qué contiene el fichero", archivo="CSV o JSONL; ver columnas en /exportar")
+async def importar(interaction: discord.Interaction, datos: app_commands.Choice[str], archivo: discord.Attachment):
+    fmt = bulk.formato(archivo.filename)
+    if fmt is None:
+        return await tracing.responder(interaction, "❌ El fichero debe ser .csv o .jsonl.", ephemeral=True)
+    if archivo.size > bulk.MAX_IMPORTAR:
+        return await tracing.responder(interaction, f"❌ Máximo {bulk.MAX_IMPORTAR // 2**20} MB.", ephemeral=True)
+    await tracing.diferir(interaction, ephemeral=True, thinking=True)
+    async with particiones.usar(interaction.guild_id) as part:
+        path = fichero_temporal(f".{fmt}")
+        try:
+            with tracing.etapa(interaction, "datos"):
+                await bulk.descargar(archivo.url, path)
+                validar = bulk.validar_dnis if datos.value == "dnis" else bulk.validar_antecedentes
+                validos, errores = await asyncio.to_thread(validar, bulk.leer_filas(path, fmt), part.registry)
+                async with writer.retener():  # nada a disco hasta tener todas las filas
+                    n = await bulk.aplicar(part, datos.value, validos, errores)
+        except (OSError, aiohttp.ClientError, UnicodeDecodeError, csv.Error) as e:
+            return await tracing.responder(interaction, f"❌ No se pudo leer el fichero: {e}", ephemeral=True)
+        finally:
+            os.remove(path)
+        ficha_cache.discard_where(lambda k: k[0] == part.guild_id)
+        with tracing.etapa(interaction, "datos"):
+            await writer.flush()  # un único volcado para todas las filas
+        texto = f"✅ Importados {n} {datos.name.lower()}."
+        if not errores:
+            return await tracing.responder(interaction, texto, ephemeral=True)
+        texto += f"\n❌ {len(errores)} filas con errores (informe adjunto)."
+        fichero = discord.File(io.BytesIO(bulk.informe(errores).encode("utf-8")), filename="errores_importacion.txt")
+        await tracing.responder(interaction, texto, file=fichero, ephemeral=True)
+
+@solo_admin()
+@app_commands.choices(datos=DATOS_MASIVOS, formato=[app_commands.Choice(name="CSV", value="csv"),
+                                                    app_commands.Choice(name="JSONL", value="jsonl")])
+@bot.tree.command(name="exportar", description="Exporta los DNIs o antecedentes de este servidor.")
+@app_commands.guild_only()
+@app_commands.describe(datos="Qué exportar", formato="Formato del fichero")
+async def exportar(interaction: discord.Interaction, datos: app_commands.Choice[str], formato: app_commands.Choice[str]):
+    await tracing.diferir(interaction, ephemeral=True, thinking=True)
+    async with particiones.usar(interaction.guild_id) as part:
+        path = fichero_temporal(f".{formato.value}")
+        try:
+            with tracing.etapa(interaction, "datos"):
+                n = await asyncio.to_thread(bulk.exportar, part, datos.value, formato.value, path)
+                if os.path.getsize(path) > interaction.guild.filesize_limit:
+                    path = await asyncio.to_thread(bulk.comprimir, path)
+            if os.path.getsize(path) > interaction.guild.filesize_limit:
+                return await tracing.responder(interaction, "❌ La exportación supera el tamaño máximo de subida del servidor.", ephemeral=True)
+            nombre = f"{datos.value}_{interaction.guild_id}.{formato.value}" + (".gz" if path.endswith(".gz") else "")
+            await tracing.responder(interaction, f"✅ {n} filas exportadas.", file=discord.File(path, filename=nombre), ephemeral=True)
+        finally:
+            os.remove(path)
+
+@solo_admin_o_administrador()
+@app_commands.choices(
+    accion=[app_commands.Choice(name=n, value=n) for n in ("ver", "añadir", "quitar", "restablecer")],
+    tipo=[app_commands.Choice(name="Admin", value="admin"), app_commands.Choice(name="Policía", value="policia")],
+)
+@bot.tree.command(name="roles", description="Configura los roles de admin y policía de este servidor.")
+@app_commands.guild_only()
+@app_commands.describe(accion="Qué hacer", tipo="Roles de admin o de policía", rol="Rol a añadir o quitar")
+async def roles(interaction: discord.Interaction, accion: app_commands.Choice[str],
+                tipo: app_commands.Choice[str] = None, rol: discord.Role = None):
+    gid = interaction.guild_id
+    if accion.value in ("añadir", "quitar") and (tipo is None or rol is None):
+        return await tracing.responder(interaction, "❌ Indica el tipo y el rol.", ephemeral=True)
+    try:
+        if accion.value == "restablecer":
+            await permisos.restablecer(gid)
+        elif accion.value in ("añadir", "quitar"):
+            actual = permisos.roles(gid)[tipo.value]
+            await permisos.configurar(gid, tipo.value, actual | {rol.id} if accion.value == "añadir" else actual - {rol.id})
+    except OSError as e:
+        return await tracing.responder(interaction, f"❌ No se pudo guardar la configuración; no ha cambiado nada: {e}", ephemeral=True)
+    r = permisos.roles(gid)
+    emb = discord.Embed(title="🛡️ Roles del bot", color=0x3498DB)
+    for k, nombre in (("admin", "Admin"), ("policia", "Policía")):
+        emb.add_field(name=nombre, value=" ".join(f"<@&{i}>" for i in sorted(r[k])) or "—", inline=False)
+    await tracing.responder(interaction, embed=emb, ephemeral=True)
+
 # ───── Arranque del bot ─────
 if __name__ == "__main__":
-    webserver.keep_alive()
+    # Sin LEGACY_GUILD_ID los datos de antes del particionado no se verían en
+    # ningún servidor: mejor no arrancar que aparentar que se han perdido.
+    pendientes = [] if LEGACY_GUILD_ID else particiones.legado_pendiente()
+    if pendientes:
+        raise SystemExit(f"❌ Hay datos sin servidor asignado ({', '.join(pendientes)}): "
+                         "define LEGACY_GUILD_ID con el ID del servidor al que pertenecen.")
     bot.run(DISCORD_TOKEN)
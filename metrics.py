@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas en memoria con salida en formato de texto de Prometheus.
+"""
+
+from bisect import bisect_left
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pares = ",".join(f'{n}="{str(v)}"'.replace("\n", " ") for n, v in zip(names, values))
+    return "{" + pares + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, v in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {v}"
+
+
+class Gauge:
+    """Valor leído en el momento de la consulta a través de ``fn()``.
+
+    Con ``kind="counter"`` expone un contador que se lleva en otro sitio.
+    """
+
+    def __init__(self, name: str, help: str, fn, kind: str = "gauge"):
+        self.name, self.help, self.fn, self.kind = name, help, fn, kind
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {self.fn()}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [cuentas por bucket..., suma, total]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        s = self._series.get(labels)
+        if s is None:
+            s = self._series[labels] = [0] * (len(self.buckets) + 2)
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for labels, s in sorted(self._series.items()):
+            acumulado = 0
+            for b, n in zip(self.buckets, s):
+                acumulado += n
+                yield f"{self.name}_bucket{_labels(names, labels + (b,))} {acumulado}"
+            yield f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {s[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {s[-2]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {s[-1]}"
+
+
+def render() -> str:
+    return "\n".join(line for m in _registry for line in m.render()) + "\n"
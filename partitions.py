@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Datos particionados por servidor (guild).
+
+Cada servidor tiene su propio directorio ``DATA_DIR/<guild_id>/`` con sus
+ficheros (o su base SQLite). Las particiones se cargan la primera vez que
+llega una interacción de ese servidor y, si el total de registros en
+memoria supera ``MAX_REGISTROS``, se descargan las menos usadas (LRU).
+
+Una partición descargada rechaza escrituras (``storage.StoreRetired``). Lo
+que la use a lo largo de varios ``await`` (importaciones, migraciones) debe
+fijarla con ``Particiones.usar`` para que no se descargue entretanto.
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import storage
+from antec_index import AntecedentesIndex
+from registry import DNIRegistry
+
+DATA_DIR     = os.getenv("DATA_DIR", "datos")
+MAX_REGISTROS = int(os.getenv("MAX_REGISTROS", 500_000))  # DNIs + antecedentes en memoria
+
+DNI_FILE   = "dni_data.json"
+ANTEC_FILE = "antecedentes_data.json"
+SQLITE_NAME = "datos.sqlite3"
+LEGADO_MARCA = ".legado_importado"  # en base_dir: los ficheros globales ya se copiaron
+
+
+class Particion:
+    """Almacenes e índices de un servidor."""
+
+    def __init__(self, guild_id: int, base_dir: str):
+        self.guild_id = guild_id
+        self.dir = os.path.join(base_dir, str(guild_id))
+        os.makedirs(self.dir, exist_ok=True)
+        self.dni_store, self.antec_store = storage.open_stores(
+            os.path.join(self.dir, DNI_FILE),
+            os.path.join(self.dir, ANTEC_FILE),
+            os.path.join(self.dir, SQLITE_NAME),
+        )
+        self.registry = DNIRegistry(self.dni_store)
+        self.antec_db = self.antec_store.data
+        self.antec_index = AntecedentesIndex(self.antec_db)
+        self.ficha_version = {}  # uid -> versión de su ficha (ver main.invalidar_ficha)
+        self.usos = 0            # usuarios de Particiones.usar; no se descarga mientras haya
+        self.retirada = False
+
+    @property
+    def stores(self) -> tuple:
+        return self.dni_store, self.antec_store
+
+    @property
+    def dirty(self) -> bool:
+        return self.dni_store.dirty or self.antec_store.dirty
+
+    def load(self):
+        """Carga ambos almacenes y construye los índices (bloqueante)."""
+        self.dni_store.load()
+        self.antec_store.load()
+        self.registry.rebuild()
+        self.antec_index.rebuild()
+        for dni, uid, otro in self.registry.duplicados:
+            print(f"⚠️ Servidor {self.guild_id}: el DNI {dni} está en {uid} y en {otro}; búsquedas por DNI solo ven {uid}.")
+
+    def ficha(self, uid: str) -> tuple:
+        """``(DNI, Antecedentes)`` de ``uid`` leídos por clave (bloqueante con SQLite)."""
+        return self.dni_store.fetch(uid), self.antec_store.fetch(uid)
+
+    def flush(self):
+        for st in self.stores:
+            st.flush()
+
+    def retirar(self):
+        """Desde aquí los almacenes rechazan escrituras; la memoria queda como versión final."""
+        self.retirada = True
+        for st in self.stores:
+            st.retired = True
+
+    def peso(self) -> int:
+        """Registros en memoria: aproximación del coste de mantenerla cargada."""
+        return len(self.registry) + sum(len(a) for a in self.antec_db.values())
+
+
+class Particiones:
+    def __init__(self, writer: storage.BackgroundWriter, base_dir: str = DATA_DIR,
+                 max_registros: int = MAX_REGISTROS, legacy_guild_id: int = None,
+                 legacy_files: tuple = (), legacy_sqlite: str = None):
+        self.writer = writer
+        self.base_dir = base_dir
+        self.max_registros = max_registros
+        self.legacy_guild_id = legacy_guild_id
+        self.legacy_files = legacy_files
+        self.legacy_sqlite = legacy_sqlite
+        self.on_evict = None  # callback(guild_id) al descargar una partición
+        self.cargas = 0
+        self.descargas = 0
+        self._parts = OrderedDict()  # guild_id -> Particion, de menos a más reciente
+        self._locks = {}
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def __iter__(self):
+        return iter(self._parts.values())
+
+    async def obtener(self, guild_id: int) -> Particion:
+        """Partición del servidor, cargándola en un hilo si no está en memoria."""
+        p = self._parts.get(guild_id)
+        if p is not None:
+            self._parts.move_to_end(guild_id)
+            return p
+        async with self._locks.setdefault(guild_id, asyncio.Lock()):
+            p = self._parts.get(guild_id)
+            if p is not None:
+                return p
+            p = await asyncio.to_thread(self._cargar, guild_id)
+            self._parts[guild_id] = p
+            self.writer.add(*p.stores)
+            self.cargas += 1
+        p.usos += 1  # la recién cargada no cuenta como candidata
+        try:
+            await self._desalojar()
+        finally:
+            p.usos -= 1
+        return p
+
+    @asynccontextmanager
+    async def usar(self, guild_id: int):
+        """``async with particiones.usar(gid) as part``: la partición no se descarga dentro del bloque."""
+        p = await self.obtener(guild_id)
+        p.usos += 1
+        try:
+            yield p
+        finally:
+            p.usos -= 1
+
+    def _cargar(self, guild_id: int) -> Particion:
+        if guild_id == self.legacy_guild_id:
+            self._importar_legado(os.path.join(self.base_dir, str(guild_id)))
+        p = Particion(guild_id, self.base_dir)
+        p.load()
+        return p
+
+    def legado_pendiente(self) -> list:
+        """Ficheros globales de antes del particionado que aún no se han copiado a ninguna partición."""
+        if os.path.exists(os.path.join(self.base_dir, LEGADO_MARCA)):
+            return []
+        ficheros = [f for path in self.legacy_files for f in (path, f"{path}.log")]
+        if self.legacy_sqlite:
+            ficheros.append(self.legacy_sqlite)
+        return [f for f in ficheros if os.path.exists(f)]
+
+    def _importar_legado(self, destino: str):
+        """La primera vez, copia los ficheros globales de antes del particionado."""
+        marca = os.path.join(self.base_dir, LEGADO_MARCA)
+        if not os.path.isdir(destino):
+            tmp = f"{destino}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)  # de un intento anterior interrumpido
+            os.makedirs(tmp)
+            for path in self.legacy_files:
+                for f in (path, f"{path}.log"):
+                    if os.path.exists(f):
+                        shutil.copy2(f, os.path.join(tmp, os.path.basename(f)))
+            if self.legacy_sqlite and os.path.exists(self.legacy_sqlite):
+                # Copia consistente aunque haya páginas aún en el -wal
+                src, dst = sqlite3.connect(self.legacy_sqlite), sqlite3.connect(os.path.join(tmp, SQLITE_NAME))
+                try:
+                    src.backup(dst)
+                finally:
+                    src.close(); dst.close()
+            os.rename(tmp, destino)
+        if not os.path.exists(marca):
+            with open(marca, "w", encoding="utf-8") as f:
+                f.write(f"{self.legacy_guild_id}\n")
+
+    async def _desalojar(self):
+        # Solo se llama tras cargar una partición, así que recalcular el peso
+        # de todas (lineal en registros residentes) no está en el camino caliente.
+        pesos = {gid: p.peso() for gid, p in self._parts.items()}
+        for guild_id, p in list(self._parts.items()):  # de menos a más reciente
+            if sum(pesos.values()) <= self.max_registros:
+                break
+            async with self._locks.setdefault(guild_id, asyncio.Lock()):
+                if self._parts.get(guild_id) is not p or p.usos:
+                    continue
+                del self._parts[guild_id]
+                del pesos[guild_id]
+                p.retirar()
+                try:
+                    await asyncio.to_thread(p.flush)
+                except Exception as e:
+                    print(f"⚠️ Error guardando la partición {guild_id} al descargarla: {e!r}")  # la reintenta el escritor
+                await self.writer.retire(*p.stores)
+                self.descargas += 1
+            if self.on_evict:
+                self.on_evict(guild_id)
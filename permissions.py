@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Roles de admin y policía configurables por servidor, con caché del nivel de
+cada miembro.
+
+El nivel (ninguno, policía, admin) se resuelve consultando solo los roles
+configurados y se guarda por (servidor, miembro) durante ``ttl`` segundos.
+Solo tiene sentido cachear con el intent de miembros, que permite invalidar
+con ``on_member_update`` y demás eventos. Sin él el bot no se entera de que
+a alguien le han quitado un rol, así que se usa ``ttl=0``: el nivel se
+resuelve en cada interacción con los roles que trae el propio Discord.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import discord
+
+from cache import LRUCache
+from storage import atomic_write_json
+
+PERMISOS_TTL = float(os.getenv("PERMISOS_TTL", 60))  # s que vale un nivel en caché (con intent de miembros)
+
+NINGUNO, POLICIA, ADMIN = 0, 1, 2
+
+
+class Permisos:
+    def __init__(self, path: str, admin_defecto=(), policia_defecto=(), ttl: float = PERMISOS_TTL, maxsize: int = 10_000):
+        self.path = path
+        self.defecto = {"admin": frozenset(admin_defecto), "policia": frozenset(policia_defecto)}
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._cache = LRUCache(maxsize)  # (guild_id, member_id) -> (nivel, caduca)
+        self._roles = self._load()       # guild_id -> {"admin": frozenset, "policia": frozenset}
+        self._save_lock = threading.Lock()
+        self._cambios = asyncio.Lock()   # serializa configurar/restablecer (leen, guardan y aplican)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {int(g): {k: frozenset(v) for k, v in r.items()} for g, r in datos.items()}
+
+    def roles(self, guild_id: int) -> dict:
+        """``{"admin": ids, "policia": ids}`` del servidor (los de por defecto si no se configuró)."""
+        return self._roles.get(guild_id, self.defecto)
+
+    def nivel(self, member: discord.Member) -> int:
+        if self.ttl <= 0:
+            self.fallos += 1
+            return self._resolver(member)
+        key = (member.guild.id, member.id)
+        v = self._cache.get(key)
+        if v is not None and v[1] > time.monotonic():
+            self.aciertos += 1
+            return v[0]
+        self.fallos += 1
+        nivel = self._resolver(member)
+        self._cache.put(key, (nivel, time.monotonic() + self.ttl))
+        return nivel
+
+    def _resolver(self, member: discord.Member) -> int:
+        # Se recorren los roles configurados (pocos) y no todos los del miembro
+        r = self.roles(member.guild.id)
+        if any(member.get_role(rid) for rid in r["admin"]):
+            return ADMIN
+        if any(member.get_role(rid) for rid in r["policia"]):
+            return POLICIA
+        return NINGUNO
+
+    def invalidar(self, guild_id: int, member_id: int = None):
+        if member_id is None:
+            self._cache.discard_where(lambda k: k[0] == guild_id)
+        else:
+            self._cache.discard((guild_id, member_id))
+
+    async def configurar(self, guild_id: int, tipo: str, roles):
+        """Sustituye los roles ``tipo`` ("admin"/"policia") del servidor y lo guarda en disco."""
+        async with self._cambios:
+            actual = dict(self.roles(guild_id))
+            actual[tipo] = frozenset(roles)
+            await self._save({**self._roles, guild_id: actual}, guild_id)
+
+    async def restablecer(self, guild_id: int):
+        async with self._cambios:
+            nuevos = dict(self._roles)
+            nuevos.pop(guild_id, None)
+            await self._save(nuevos, guild_id)
+
+    async def _save(self, nuevos: dict, guild_id: int):
+        """Escribe ``nuevos`` y solo entonces lo aplica; si falla la escritura, nada cambia."""
+        snapshot = {str(g): {k: sorted(v) for k, v in r.items()} for g, r in nuevos.items()}
+        def write():
+            with self._save_lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                atomic_write_json(self.path, snapshot, indent=2)
+        await asyncio.to_thread(write)
+        self._roles = nuevos
+        self.invalidar(guild_id)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Representación compacta en memoria de DNIs y antecedentes.
+
+Clases con ``__slots__`` en lugar de dicts, campos de pocos valores
+(sexo, nacionalidad, tipo) internados y fechas guardadas como ordinales
+(``date.toordinal()``). La conversión a/desde el formato de siempre
+(dicts de cadenas) se hace al serializar y al construir los embeds.
+
+Aquí están también las reglas de validación que comparten los modales y
+la importación masiva.
+"""
+
+import datetime
+import re
+import sys
+
+
+def fecha_a_ordinal(texto: str):
+    """'25/06/2025' -> ordinal; si no es exactamente DD/MM/AAAA válida se conserva el texto."""
+    try:
+        d, m, a = texto.split("/")
+        if len(d) == 2 and len(m) == 2 and len(a) == 4 and (d + m + a).isdigit():
+            return datetime.date(int(a), int(m), int(d)).toordinal()
+    except (AttributeError, ValueError):
+        pass
+    return texto
+
+
+def ordinal_a_fecha(valor) -> str:
+    if isinstance(valor, int):
+        f = datetime.date.fromordinal(valor)
+        return f"{f.day:02d}/{f.month:02d}/{f.year:04d}"
+    return valor
+
+
+def validar_dni(nombre, apellidos, dni, nacimiento, sexo, nacionalidad,
+                existe=lambda dni: False, expedicion=None, caducidad=None) -> dict:
+    """Normaliza y valida un DNI con las reglas de los modales.
+
+    Devuelve el dict listo para ``DNI.from_json`` o lanza ``ValueError`` con
+    el mensaje para el usuario. ``existe(dni)`` detecta DNIs duplicados.
+    """
+    hoy = datetime.date.today()
+    data = {
+        "nombre":       (nombre or "").strip(),
+        "apellidos":    (apellidos or "").strip(),
+        "dni":          (dni or "").strip().upper(),
+        "nacimiento":   (nacimiento or "").strip(),
+        "sexo":         (sexo or "").strip().upper(),
+        "nacionalidad": (nacionalidad or "").strip().upper(),
+        "expedicion":   (expedicion or "").strip() or hoy.strftime("%d/%m/%Y"),
+        "caducidad":    (caducidad or "").strip() or hoy.replace(year=hoy.year + 10).strftime("%d/%m/%Y"),
+    }
+    if not 1 <= len(data["nombre"]) <= 30 or not 1 <= len(data["apellidos"]) <= 60:
+        raise ValueError("❌ Nombre (máx. 30) y apellidos (máx. 60) son obligatorios.")
+    if not re.fullmatch(r"\d{9}[A-Z]", data["dni"]):
+        raise ValueError("❌ DNI inválido.")
+    if any(len(data[k]) != 10 for k in DNI.FECHAS):
+        raise ValueError("❌ Las fechas deben ser DD/MM/AAAA.")
+    if data["sexo"] not in {"H", "M"}:
+        raise ValueError("❌ Sexo debe ser H o M.")
+    if not re.fullmatch(r"[A-Z]{3}", data["nacionalidad"]):
+        raise ValueError("❌ Nacionalidad debe ser 3 letras.")
+    if existe(data["dni"]):
+        raise ValueError("❌ Ese DNI ya existe.")
+    return data
+
+
+def validar_antecedente(tipo, fecha, descripcion) -> tuple:
+    """(tipo, fecha, descripcion) limpios con los límites del modal, o ``ValueError``."""
+    tipo, fecha, descripcion = ((v or "").strip() for v in (tipo, fecha, descripcion))
+    if not 1 <= len(tipo) <= 50:
+        raise ValueError("❌ Tipo obligatorio (máx. 50).")
+    if len(fecha) != 10:
+        raise ValueError("❌ Fecha debe ser DD/MM/AAAA.")
+    if not 1 <= len(descripcion) <= 200:
+        raise ValueError("❌ Descripción obligatoria (máx. 200).")
+    return tipo, fecha, descripcion
+
+
+def _intern(valor):
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+class DNI:
+    __slots__ = ("nombre", "apellidos", "dni", "nacimiento", "sexo", "nacionalidad", "expedicion", "caducidad")
+
+    CAMPOS = __slots__
+    FECHAS = ("nacimiento", "expedicion", "caducidad")
+
+    def __init__(self, nombre, apellidos, dni, nacimiento, sexo, nacionalidad, expedicion, caducidad):
+        self.nombre       = nombre
+        self.apellidos    = apellidos
+        self.dni          = dni
+        self.nacimiento   = fecha_a_ordinal(nacimiento)
+        self.sexo         = _intern(sexo)
+        self.nacionalidad = _intern(nacionalidad)
+        self.expedicion   = fecha_a_ordinal(expedicion)
+        self.caducidad    = fecha_a_ordinal(caducidad)
+
+    @classmethod
+    def from_json(cls, d: dict) -> "DNI":
+        return cls(*(d.get(k) for k in cls.CAMPOS))
+
+    def to_json(self) -> dict:
+        """Dict de cadenas, como se guarda y como lo usan los embeds."""
+        d = {k: getattr(self, k) for k in self.CAMPOS}
+        for k in self.FECHAS:
+            d[k] = ordinal_a_fecha(d[k])
+        return d
+
+
+class Antecedente:
+    __slots__ = ("id", "tipo", "fecha", "descripcion")
+
+    def __init__(self, id: int, tipo: str, fecha: str, descripcion: str):
+        self.id          = id
+        self.tipo        = _intern(tipo)
+        self.fecha       = fecha_a_ordinal(fecha)
+        self.descripcion = descripcion
+
+    @classmethod
+    def from_json(cls, d: dict) -> "Antecedente":
+        return cls(d["id"], d.get("tipo"), d.get("fecha"), d.get("descripcion"))
+
+    def to_json(self) -> dict:
+        return {"id": self.id, "tipo": self.tipo, "fecha": ordinal_a_fecha(self.fecha), "descripcion": self.descripcion}
+
+    @property
+    def fecha_texto(self) -> str:
+        return ordinal_a_fecha(self.fecha)
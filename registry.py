@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de DNIs con índices en memoria sobre el almacén de DNIs.
+
+- ``by_dni``: número de DNI -> id de usuario (comprobación de duplicados O(1)).
+- índice de prefijos: lista ordenada de (token normalizado, id de usuario)
+  con los tokens de nombre, apellidos y número de DNI, consultada con bisect.
+"""
+
+import unicodedata
+from bisect import bisect_left, insort
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes: 'Núñez' -> 'nunez'."""
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _tokens(rec) -> set:
+    partes = f"{rec.nombre or ''} {rec.apellidos or ''}".split()
+    return {normalizar(p) for p in partes} | {rec.dni.casefold()}
+
+
+class DNIRegistry:
+    def __init__(self, store):
+        self.store = store
+        self.rebuild()
+
+    def rebuild(self):
+        """Reconstruye los índices desde ``store.data`` (p. ej. tras una importación)."""
+        self.by_dni = {}
+        self.duplicados = []  # (dni, uid conservado, uid repetido) encontrados al reconstruir
+        self._names = []
+        self._sin_ordenar = []  # tokens de add_many(ordenar=False) a la espera de ordenar()
+        for uid, rec in self.store.data.items():
+            otro = self.by_dni.setdefault(rec.dni, uid)
+            if otro != uid:
+                self.duplicados.append((rec.dni, otro, uid))
+            self._names.extend((t, uid) for t in _tokens(rec))
+        self._names.sort()
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.store.data
+
+    def __len__(self) -> int:
+        return len(self.store.data)
+
+    def get(self, uid: str):
+        return self.store.data.get(uid)
+
+    def uid_for_dni(self, dni: str):
+        return self.by_dni.get(dni)
+
+    def add(self, uid: str, rec):
+        old = self.store.data.get(uid)
+        if old is not None:
+            self._unindex(uid, old)
+        self.store.set(uid, rec)
+        self.by_dni[rec.dni] = uid
+        for t in _tokens(rec):
+            insort(self._names, (t, uid))
+
+    def add_many(self, items, ordenar: bool = True):
+        """Alta masiva de ``(uid, rec)``: un solo sort del índice en lugar de un insort por registro.
+
+        Con ``ordenar=False`` (importación por lotes) los tokens esperan a
+        ``ordenar()`` y hasta entonces la búsqueda por nombre no los ve.
+        """
+        for uid, rec in items:
+            old = self.store.data.get(uid)
+            if old is not None:
+                self._unindex(uid, old)
+            self.store.set(uid, rec)
+            self.by_dni[rec.dni] = uid
+            self._sin_ordenar.extend((t, uid) for t in _tokens(rec))
+        if ordenar:
+            self.ordenar()
+
+    def ordenar(self):
+        """Pasa al índice de nombres los tokens pendientes de ``add_many``."""
+        if self._sin_ordenar:
+            self._names += self._sin_ordenar
+            self._names.sort()
+            self._sin_ordenar = []
+
+    def remove(self, uid: str) -> bool:
+        rec = self.store.data.get(uid)
+        if rec is None:
+            return False
+        self._unindex(uid, rec)
+        self.store.delete(uid)
+        return True
+
+    def _unindex(self, uid: str, rec):
+        if self.by_dni.get(rec.dni) == uid:
+            del self.by_dni[rec.dni]
+        for t in _tokens(rec):
+            i = bisect_left(self._names, (t, uid))
+            if i < len(self._names) and self._names[i] == (t, uid):
+                del self._names[i]
+            elif self._sin_ordenar and (t, uid) in self._sin_ordenar:
+                self._sin_ordenar.remove((t, uid))
+
+    def search(self, consulta: str, limit: int = 25) -> list:
+        """Ids de usuario cuyo nombre, apellido o DNI empieza por cada palabra de ``consulta``.
+
+        Se recorre el tramo del índice de la palabra con menos coincidencias
+        y las demás se comprueban contra los tokens de cada candidato, hasta
+        reunir ``limit``.
+        """
+        palabras = {normalizar(p) for p in consulta.split()}
+        if not palabras:
+            return []
+        tramos = {p: (bisect_left(self._names, (p,)), bisect_left(self._names, (p + "\U0010ffff",))) for p in palabras}
+        p = min(palabras, key=lambda p: tramos[p][1] - tramos[p][0])
+        resto = palabras - {p}
+        resultado, vistos = [], set()
+        for i in range(*tramos[p]):
+            uid = self._names[i][1]
+            if uid in vistos:
+                continue
+            vistos.add(uid)
+            if resto:
+                tokens = _tokens(self.store.data[uid])
+                if not all(any(t.startswith(q) for t in tokens) for q in resto):
+                    continue
+            resultado.append(uid)
+            if len(resultado) >= limit:
+                break
+        return sorted(resultado, key=lambda u: normalizar(self.store.data[u].apellidos or ""))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Borrado programado de los DMs con DNIs compartidos.
+
+Un único temporizador sobre un min-heap de plazos; los pendientes se guardan
+en disco para retomarlos tras un reinicio del bot. Un borrado que falla por
+un error transitorio (5xx, límite de peticiones, red) vuelve al heap con
+espera exponencial; solo se descarta si el mensaje ya no existe o no hay
+acceso a él.
+"""
+
+import asyncio
+import heapq
+import json
+import threading
+import time
+
+import discord
+
+from storage import atomic_write_json
+
+MAX_RETENCION  = 3600  # segundos máximos que un DNI compartido sigue visible
+REINTENTO_BASE = 5     # s de espera tras el primer fallo; se duplica en cada intento
+REINTENTO_MAX  = 300
+MAX_INTENTOS   = 12
+
+
+class DeletionScheduler:
+    def __init__(self, client: discord.Client, path: str):
+        self.client = client
+        self.path = path
+        self._heap = self._load()
+        heapq.heapify(self._heap)
+        self._wakeup = asyncio.Event()
+        self._save_lock = threading.Lock()
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _load(self) -> list:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return [tuple(e) for e in json.load(f)]
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    async def _save(self):
+        snapshot = list(self._heap)
+        def write():
+            with self._save_lock:
+                atomic_write_json(self.path, snapshot)
+        await asyncio.to_thread(write)
+
+    async def schedule(self, message: discord.Message, segundos: int):
+        """Programa el borrado de ``message`` dentro de ``segundos`` (acotado a MAX_RETENCION)."""
+        segundos = min(max(segundos, 1), MAX_RETENCION)
+        entry = (time.time() + segundos, message.channel.id, message.id)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()  # el nuevo plazo es el más próximo
+        await self._save()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self._vuelta()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # p. ej. OSError al guardar: el temporizador no puede morir
+                print(f"⚠️ Error en los borrados programados: {e!r}")
+                await asyncio.sleep(REINTENTO_BASE)
+
+    async def _vuelta(self):
+        while True:
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue  # hay un plazo nuevo: recalcular
+                except asyncio.TimeoutError:
+                    pass
+            now = time.time()
+            vencidos = []
+            while self._heap and self._heap[0][0] <= now:
+                vencidos.append(heapq.heappop(self._heap))
+            await asyncio.gather(*(self._delete(*e[1:]) for e in vencidos))
+            await self._save()
+
+    async def _delete(self, channel_id: int, message_id: int, intentos: int = 0):
+        canal = self.client.get_partial_messageable(channel_id)
+        try:
+            await canal.get_partial_message(message_id).delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass  # ya borrado o sin acceso: no hay nada más que hacer
+        except Exception as e:
+            intentos += 1
+            if intentos >= MAX_INTENTOS:
+                print(f"⚠️ No se pudo borrar el mensaje {message_id} tras {intentos} intentos: {e!r}")
+                return
+            espera = min(REINTENTO_BASE * 2 ** (intentos - 1), REINTENTO_MAX)
+            heapq.heappush(self._heap, (time.time() + espera, channel_id, message_id, intentos))
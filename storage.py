@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+"""
+Almacenamiento con diario (journal) de solo-añadido.
+
+Cada mutación se escribe como una línea JSON pequeña en ``<fichero>.log``
+(en segundo plano, agrupando ráfagas, ver ``BackgroundWriter``);
+cada cierto número de operaciones el diario se compacta en la instantánea
+(el propio ``<fichero>``, mismo formato que antes) mediante un reemplazo
+atómico. Al arrancar se lee la instantánea y se reaplica el diario.
+
+Con ``STORAGE_BACKEND=sqlite`` se usa en su lugar una base SQLite (ver
+``open_stores``).
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from antecedentes import Antecedentes
+from records import DNI
+
+COMPACT_EVERY = 500  # operaciones en el diario antes de compactar
+FLUSH_DELAY   = 0.5  # segundos que se agrupan los cambios antes de volcar
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()  # "json" o "sqlite"
+SQLITE_FILE     = os.getenv("SQLITE_FILE", "dni_bot.sqlite3")
+
+
+def atomic_write_json(path: str, data, indent=None):
+    """Escribe ``data`` en un temporal, hace fsync y lo renombra sobre ``path``."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+
+def _fsync_dir(path: str):
+    # Persiste la entrada del directorio tras os.replace (no disponible en Windows)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _identity(value):
+    return value
+
+
+def _close_all(stores):
+    for st in stores:
+        st.close()
+
+
+def read_snapshot(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def repair_journal(log_path: str) -> int:
+    """Recorta una última línea a medias (cierre brusco) para que lo siguiente
+    que se añada no se pegue a ella. Devuelve los bytes descartados."""
+    try:
+        f = open(log_path, "rb+")
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        fin = size
+        while fin > 0:  # busca el último salto de línea leyendo hacia atrás
+            inicio = max(0, fin - 4096)
+            f.seek(inicio)
+            i = f.read(fin - inicio).rfind(b"\n")
+            if i != -1:
+                fin = inicio + i + 1
+                break
+            fin = inicio
+        if fin < size:
+            f.truncate(fin)
+            f.flush()
+            os.fsync(f.fileno())
+        return size - fin
+
+
+def replay_journal(log_path: str, data: dict) -> int:
+    """Aplica sobre ``data`` las operaciones del diario. Devuelve cuántas aplicó."""
+    n = 0
+    try:
+        f = open(log_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return 0
+    with f:
+        for line in f:
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # línea corrupta; la última a medias la quita repair_journal
+            if op["op"] == "set":
+                data[op["k"]] = op["v"]
+            elif op["op"] == "del":
+                data.pop(op["k"], None)
+            n += 1
+    return n
+
+
+class StoreRetired(RuntimeError):
+    """Escritura en un almacén ya retirado (su partición se descargó de memoria)."""
+
+
+class JournalStore:
+    """Diccionario persistente: ``data`` en memoria + diario en disco.
+
+    ``set``/``delete`` solo tocan memoria: serializan la operación al
+    momento (el valor puede seguir mutando después) y la dejan pendiente,
+    agrupada por clave. ``flush`` la escribe y puede ejecutarse en un hilo.
+    ``encode``/``decode`` convierten entre los valores en memoria y su
+    forma JSON.
+    """
+
+    def __init__(self, path: str, compact_every: int = COMPACT_EVERY, encode=None, decode=None):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.compact_every = compact_every
+        self.encode = encode or _identity
+        self.decode = decode or _identity
+        self.data = {}
+        self.ops = 0
+        self.on_dirty = None
+        self.retired = False  # ver StoreRetired
+        self._pending = {}
+        self._lock = threading.Lock()     # protege _pending
+        self._io_lock = threading.Lock()  # un solo flush a la vez
+
+    def load(self):
+        """Lee la instantánea y reaplica el diario (bloqueante: usar en un hilo)."""
+        if repair_journal(self.log_path):
+            print(f"⚠️ {self.log_path}: descartada una última operación incompleta.")
+        raw = read_snapshot(self.path)
+        self.ops = replay_journal(self.log_path, raw)
+        self.data.clear()
+        self.data.update((k, self.decode(v)) for k, v in raw.items())
+
+    def fetch(self, key: str):
+        return self.data.get(key)  # instantánea y diario ya están enteros en memoria
+
+    def close(self):
+        pass
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def set(self, key: str, value):
+        self.data[key] = value
+        self._queue(key, {"op": "set", "k": key, "v": self.encode(value)})
+
+    def delete(self, key: str):
+        if self.data.pop(key, None) is not None:
+            self._queue(key, {"op": "del", "k": key})
+
+    def _queue(self, key: str, op: dict):
+        if self.retired:
+            raise StoreRetired(self.path)
+        line = json.dumps(op, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._pending[key] = line
+        if self.on_dirty:
+            self.on_dirty()
+
+    def flush(self):
+        """Añade al diario lo pendiente con fsync; compacta si toca."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.writelines(pending.values())
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                with self._lock:  # lo más reciente gana sobre lo que falló
+                    self._pending = {**pending, **self._pending}
+                raise
+            self.ops += len(pending)
+            if self.ops >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """Rehace la instantánea a partir de los ficheros y vacía el diario.
+
+        Trabaja solo con disco para no leer ``data`` mientras el bucle de
+        eventos la modifica. Si el proceso muere entre el reemplazo y el
+        vaciado, el diario se reaplica sobre la instantánea nueva: las
+        operaciones son idempotentes.
+        """
+        snap = read_snapshot(self.path)
+        replay_journal(self.log_path, snap)
+        atomic_write_json(self.path, snap, indent=2)
+        open(self.log_path, "w").close()
+        self.ops = 0
+
+
+class BackgroundWriter:
+    """Tarea que agrupa las notificaciones de cambios y vuelca en un hilo."""
+
+    def __init__(self, stores=(), delay: float = FLUSH_DELAY):
+        self.stores = []
+        self.delay = delay
+        self.last_flush = None  # (time.time() al terminar, segundos empleados)
+        self.on_flush = None    # callback(segundos) tras cada volcado correcto
+        self._event = asyncio.Event()
+        self._libre = asyncio.Event()  # sin retenciones activas (ver retener)
+        self._libre.set()
+        self._retenciones = 0
+        self._retiring = set()
+        self._task = None
+        self.add(*stores)
+
+    def add(self, *stores):
+        for st in stores:
+            st.on_dirty = self._event.set
+            self.stores.append(st)
+
+    async def retire(self, *stores):
+        """Deja de vigilar ``stores`` y los cierra en cuanto no les quede nada pendiente."""
+        self._retiring.update(stores)
+        await self._cerrar_retirados()
+        if self._retiring:
+            self._event.set()
+
+    @asynccontextmanager
+    async def retener(self):
+        """Sin volcados automáticos dentro del bloque (importaciones masivas).
+
+        Lo que se acumule se vuelca al salir, en la siguiente vuelta de la
+        tarea o con un ``flush`` explícito.
+        """
+        self._retenciones += 1
+        self._libre.clear()
+        try:
+            yield
+        finally:
+            self._retenciones -= 1
+            if not self._retenciones:
+                self._libre.set()
+
+    @property
+    def pending(self) -> int:
+        return sum(st.pending for st in self.stores)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            await asyncio.sleep(self.delay)  # deja que se acumule la ráfaga
+            await self._libre.wait()
+            self._event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Error guardando datos: {e!r}")
+                self._event.set()  # reintenta en la siguiente vuelta
+
+    async def flush(self):
+        await asyncio.to_thread(self._flush_all, list(self.stores))
+        await self._cerrar_retirados()
+
+    async def _cerrar_retirados(self):
+        fuera = {st for st in self._retiring if not st.dirty}
+        if fuera:
+            self.stores = [st for st in self.stores if st not in fuera]
+            self._retiring -= fuera
+            await asyncio.to_thread(_close_all, fuera)
+
+    def _flush_all(self, stores):
+        t0 = time.perf_counter()
+        for st in stores:
+            st.flush()
+        self.last_flush = (time.time(), time.perf_counter() - t0)
+        if self.on_flush:
+            self.on_flush(self.last_flush[1])
+
+    async def stop(self):
+        """Detiene la tarea y vuelca todo lo pendiente (apagado del dyno)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# ───── Backend SQLite (STORAGE_BACKEND=sqlite) ─────
+# Misma interfaz que JournalStore: ``data`` en memoria como vía de lectura,
+# ``set``/``delete`` dejan filas pendientes y ``flush`` las aplica en una
+# transacción. Las sentencias son constantes para que el caché de sentencias
+# preparadas de sqlite3 las reutilice.
+
+class DniTable:
+    name = "dnis"
+    fields = ("nombre", "apellidos", "dni", "nacimiento", "sexo", "nacionalidad", "expedicion", "caducidad")
+    schema = """
+        CREATE TABLE IF NOT EXISTS dnis (
+            uid TEXT PRIMARY KEY, nombre TEXT, apellidos TEXT, dni TEXT NOT NULL,
+            nacimiento TEXT, sexo TEXT, nacionalidad TEXT, expedicion TEXT, caducidad TEXT
+        );
+    """
+    SELECT_ALL = "SELECT uid, nombre, apellidos, dni, nacimiento, sexo, nacionalidad, expedicion, caducidad FROM dnis"
+    SELECT_UID = SELECT_ALL + " WHERE uid = ?"
+    # ON CONFLICT(uid) y no INSERT OR REPLACE: con el índice UNIQUE de dni,
+    # REPLACE borraría en silencio la fila de otro usuario con el mismo DNI.
+    UPSERT     = ("INSERT INTO dnis VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(uid) DO UPDATE SET "
+                  "nombre = excluded.nombre, apellidos = excluded.apellidos, dni = excluded.dni, "
+                  "nacimiento = excluded.nacimiento, sexo = excluded.sexo, nacionalidad = excluded.nacionalidad, "
+                  "expedicion = excluded.expedicion, caducidad = excluded.caducidad")
+    DELETE     = "DELETE FROM dnis WHERE uid = ?"
+    DUPLICADOS = "SELECT dni, group_concat(uid, ', ') FROM dnis GROUP BY dni HAVING count(*) > 1"
+
+    @classmethod
+    def migrate(cls, conn, path: str):
+        """Índice UNIQUE sobre ``dni``. Si la base ya trae DNIs repetidos se avisa
+        y se deja el índice normal hasta que se corrijan."""
+        try:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_dnis_dni_unico ON dnis (dni)")
+        except sqlite3.IntegrityError:
+            for dni, uids in conn.execute(cls.DUPLICADOS):
+                print(f"⚠️ {path}: el DNI {dni} está repetido en los usuarios {uids}.")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_dnis_dni ON dnis (dni)")
+        else:
+            conn.execute("DROP INDEX IF EXISTS idx_dnis_dni")
+
+    @classmethod
+    def to_rows(cls, uid: str, rec: dict):
+        return (uid, *(rec.get(k) for k in cls.fields))
+
+    @classmethod
+    def write(cls, conn, uid: str, row):
+        conn.execute(cls.UPSERT, row)
+
+    @classmethod
+    def remove(cls, conn, uid: str):
+        conn.execute(cls.DELETE, (uid,))
+
+    @classmethod
+    def load(cls, conn) -> dict:
+        return {row[0]: dict(zip(cls.fields, row[1:])) for row in conn.execute(cls.SELECT_ALL)}
+
+    @classmethod
+    def fetch(cls, conn, uid: str):
+        row = conn.execute(cls.SELECT_UID, (uid,)).fetchone()
+        return dict(zip(cls.fields, row[1:])) if row else None
+
+
+class AntecedentesTable:
+    name = "antecedentes"
+    fields = ("id", "tipo", "fecha", "descripcion")
+    schema = """
+        CREATE TABLE IF NOT EXISTS antecedentes (
+            uid TEXT NOT NULL, id INTEGER NOT NULL, tipo TEXT, fecha TEXT, descripcion TEXT,
+            PRIMARY KEY (uid, id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS antecedentes_seq (
+            uid TEXT PRIMARY KEY, seq INTEGER NOT NULL
+        );
+    """
+    SELECT_ALL = "SELECT uid, id, tipo, fecha, descripcion FROM antecedentes ORDER BY uid, id"
+    SELECT_UID = "SELECT id, tipo, fecha, descripcion FROM antecedentes WHERE uid = ? ORDER BY id"
+    SELECT_SEQ = "SELECT uid, seq FROM antecedentes_seq"
+    SELECT_UID_SEQ = "SELECT seq FROM antecedentes_seq WHERE uid = ?"
+    INSERT     = "INSERT INTO antecedentes VALUES (?, ?, ?, ?, ?)"
+    UPSERT_SEQ = "INSERT OR REPLACE INTO antecedentes_seq VALUES (?, ?)"
+    DELETE     = "DELETE FROM antecedentes WHERE uid = ?"
+    DELETE_SEQ = "DELETE FROM antecedentes_seq WHERE uid = ?"
+
+    @classmethod
+    def to_rows(cls, uid: str, value):
+        """``value``: ``{"seq", "items"}`` o la lista antigua de antecedentes."""
+        items = value if isinstance(value, list) else value["items"]
+        seq = max((a["id"] for a in items), default=0) if isinstance(value, list) else value["seq"]
+        return seq, [(uid, *(a.get(k) for k in cls.fields)) for a in items]
+
+    @classmethod
+    def write(cls, conn, uid: str, rows):
+        seq, items = rows
+        conn.execute(cls.DELETE, (uid,))
+        conn.executemany(cls.INSERT, items)
+        conn.execute(cls.UPSERT_SEQ, (uid, seq))
+
+    @classmethod
+    def remove(cls, conn, uid: str):
+        conn.execute(cls.DELETE, (uid,))
+        conn.execute(cls.DELETE_SEQ, (uid,))
+
+    @classmethod
+    def load(cls, conn) -> dict:
+        data = {uid: {"seq": seq, "items": []} for uid, seq in conn.execute(cls.SELECT_SEQ)}
+        for row in conn.execute(cls.SELECT_ALL):
+            data.setdefault(row[0], {"seq": 0, "items": []})["items"].append(dict(zip(cls.fields, row[1:])))
+        return data
+
+    @classmethod
+    def fetch(cls, conn, uid: str):
+        seq = conn.execute(cls.SELECT_UID_SEQ, (uid,)).fetchone()
+        items = [dict(zip(cls.fields, row)) for row in conn.execute(cls.SELECT_UID, (uid,))]
+        if seq is None and not items:
+            return None
+        return {"seq": seq[0] if seq else 0, "items": items}
+
+    @classmethod
+    def migrate(cls, conn, path: str):
+        pass
+
+
+class SqliteDB:
+    """Conexión compartida (modo WAL) usada solo desde hilos de trabajo."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=64)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table in (DniTable, AntecedentesTable):
+            self.conn.executescript(table.schema)
+            table.migrate(self.conn, path)
+        self.lock = threading.Lock()
+
+    def write(self, table, changes: dict):
+        """Aplica ``{clave: filas | None}`` en una sola transacción."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Primero las bajas, para que un DNI liberado pueda reutilizarse en el mismo lote
+                for key, rows in changes.items():
+                    if rows is None:
+                        table.remove(self.conn, key)
+                for key, rows in changes.items():
+                    if rows is not None:
+                        table.write(self.conn, key, rows)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def import_json(self, dni_path: str, antec_path: str) -> tuple:
+        """Importa los ficheros JSON (instantánea + diario) en una única transacción.
+
+        Devuelve ``(dnis, ants, conflictos)``: los DNIs cuyo número ya tiene
+        otro usuario no se importan y van a ``conflictos`` como ``(uid, dni)``.
+        """
+        dnis = read_snapshot(dni_path)
+        replay_journal(f"{dni_path}.log", dnis)
+        ants = read_snapshot(antec_path)
+        replay_journal(f"{antec_path}.log", ants)
+        conflictos = []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for uid, value in list(dnis.items()):
+                    try:
+                        DniTable.write(self.conn, uid, DniTable.to_rows(uid, value))
+                    except sqlite3.IntegrityError:
+                        conflictos.append((uid, value.get("dni")))
+                        del dnis[uid]
+                for uid, value in ants.items():
+                    AntecedentesTable.write(self.conn, uid, AntecedentesTable.to_rows(uid, value))
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        return dnis, ants, conflictos
+
+    def close(self):
+        with self.lock:  # cerrar dos veces no hace nada (ambos almacenes comparten la conexión)
+            self.conn.close()
+
+
+class SqliteStore:
+    def __init__(self, db: SqliteDB, table, encode=None, decode=None):
+        self.db = db
+        self.table = table
+        self.encode = encode or _identity
+        self.decode = decode or _identity
+        self.data = {}
+        self.on_dirty = None
+        self.retired = False  # ver StoreRetired
+        self._pending = {}
+        self._en_curso = {}               # lo que está escribiendo flush ahora mismo
+        self._lock = threading.Lock()     # protege _pending y _en_curso
+        self._io_lock = threading.Lock()  # un solo flush a la vez
+
+    def load(self):
+        """Lee la tabla entera (bloqueante: usar en un hilo)."""
+        with self.db.lock:
+            raw = self.table.load(self.db.conn)
+        self.data.clear()
+        self.data.update((k, self.decode(v)) for k, v in raw.items())
+
+    def fetch(self, key: str):
+        """Registro de ``key`` leído con una consulta por clave (bloqueante: usar en un hilo).
+
+        Lo que aún está pendiente de escribir, o escribiéndose, se sirve
+        desde memoria.
+        """
+        with self._lock:
+            if key in self._pending or key in self._en_curso:
+                return self.data.get(key)
+        with self.db.lock:
+            if self.retired:  # ya volcado y quizá cerrado: la memoria es la versión final
+                return self.data.get(key)
+            raw = self.table.fetch(self.db.conn, key)
+        return None if raw is None else self.decode(raw)
+
+    def close(self):
+        self.db.close()
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending or self._en_curso)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def set(self, key: str, value):
+        self.data[key] = value
+        self._queue(key, self.table.to_rows(key, self.encode(value)))
+
+    def delete(self, key: str):
+        if self.data.pop(key, None) is not None:
+            self._queue(key, None)
+
+    def _queue(self, key: str, rows):
+        if self.retired:
+            raise StoreRetired(self.db.path)
+        with self._lock:
+            self._pending[key] = rows
+        if self.on_dirty:
+            self.on_dirty()
+
+    def flush(self):
+        # Sin _io_lock dos volcados simultáneos (escritor, /importar, desalojo)
+        # podrían confirmar un lote viejo después de uno más nuevo
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._en_curso = pending
+            if not pending:
+                return
+            try:
+                self.db.write(self.table, pending)
+            except sqlite3.Error:
+                with self._lock:
+                    self._pending = {**pending, **self._pending}
+                raise
+            finally:
+                with self._lock:
+                    self._en_curso = {}
+
+
+def open_stores(dni_path: str, antec_path: str, sqlite_path: str = SQLITE_FILE) -> tuple:
+    """Crea los almacenes de DNIs y antecedentes según ``STORAGE_BACKEND``.
+
+    Los almacenes empiezan vacíos hasta llamar a ``load()``. En memoria
+    los DNIs son objetos ``DNI`` y los antecedentes ``Antecedentes``.
+    """
+    dni_codec   = {"encode": DNI.to_json, "decode": DNI.from_json}
+    antec_codec = {"encode": Antecedentes.to_json, "decode": Antecedentes.from_json}
+    if STORAGE_BACKEND == "sqlite":
+        db = SqliteDB(sqlite_path)
+        return SqliteStore(db, DniTable, **dni_codec), SqliteStore(db, AntecedentesTable, **antec_codec)
+    return JournalStore(dni_path, **dni_codec), JournalStore(antec_path, **antec_codec)
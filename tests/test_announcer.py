@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+import pytest
+
+import announcer
+from announcer import MAX_RETRIES, AnnounceDispatcher
+
+
+class Reloj:
+    """Sustituye a time.monotonic y asyncio.sleep para que las esperas no tarden."""
+
+    def __init__(self):
+        self.t = 0.0
+
+    def monotonic(self):
+        return self.t
+
+    async def sleep(self, segundos):
+        self.t += segundos
+
+
+class Canal:
+    def __init__(self, *errores):
+        self.errores = list(errores)
+        self.envios = 0
+
+    async def send(self, embeds):
+        self.envios += 1
+        if self.errores:
+            raise self.errores.pop(0)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(announcer.time, "monotonic", r.monotonic)
+    monkeypatch.setattr(announcer.asyncio, "sleep", r.sleep)
+    return r
+
+
+def error_http(status):
+    return discord.HTTPException(SimpleNamespace(status=status, reason="error"), "error")
+
+
+def enviar(canal, n=2):
+    d = AnnounceDispatcher(SimpleNamespace(get_channel=lambda cid: canal), 1)
+    asyncio.run(d._send([discord.Embed(title=str(i)) for i in range(n)]))
+    return d
+
+
+def test_reintenta_errores_de_red_y_5xx(reloj):
+    canal = Canal(ConnectionResetError(), aiohttp.ServerDisconnectedError(), asyncio.TimeoutError(), error_http(503))
+    d = enviar(canal)
+    assert canal.envios == 5
+    assert (d.sent, d.failed) == (2, 0)
+    assert reloj.t >= 1 + 2 + 4 + 8  # espera exponencial entre intentos
+
+
+def test_error_permanente_no_reintenta(reloj):
+    canal = Canal(error_http(403))
+    d = enviar(canal)
+    assert canal.envios == 1
+    assert (d.sent, d.failed) == (0, 2)
+
+
+def test_respeta_rate_limited(reloj):
+    canal = Canal(discord.RateLimited(30.0))
+    d = enviar(canal)
+    assert canal.envios == 2
+    assert reloj.t >= 30
+    assert d.sent == 2
+
+
+def test_se_rinde_tras_max_reintentos(reloj):
+    canal = Canal(*(OSError("sin red") for _ in range(MAX_RETRIES)))
+    d = enviar(canal)
+    assert canal.envios == MAX_RETRIES
+    assert (d.sent, d.failed) == (0, 2)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from antec_index import AntecedentesIndex, fecha_consulta, palabras
+from antecedentes import Antecedentes
+
+
+def ordinal(texto):
+    d, m, a = map(int, texto.split("/"))
+    return datetime.date(a, m, d).toordinal()
+
+
+def indice():
+    db = {"1": Antecedentes(), "2": Antecedentes()}
+    db["1"].add("Robo", "10/01/2024", "Robo de un coche en la plaza")
+    db["1"].add("Tráfico", "15/02/2024", "Exceso de velocidad")
+    db["2"].add("robo", "20/02/2024", "Robo con violencia")
+    db["2"].add("Robo", "sin fecha", "Coche abandonado")
+    return db, AntecedentesIndex(db)
+
+
+def test_palabras():
+    assert palabras("Robo de un Coche en la plaza") == {"robo", "coche", "plaza"}
+    assert palabras(None) == set()
+
+
+def test_fecha_consulta():
+    assert fecha_consulta("15/02/2024") == ordinal("15/02/2024")
+    assert fecha_consulta("02/2024") == ordinal("01/02/2024")
+    assert fecha_consulta("02/2024", fin=True) == ordinal("29/02/2024")
+    assert fecha_consulta("12/2024", fin=True) == ordinal("31/12/2024")
+    assert fecha_consulta("13/2024") is None
+    assert fecha_consulta("ayer") is None
+
+
+def test_buscar_por_tipo_normalizado():
+    _, idx = indice()
+    assert idx.buscar(tipo="ROBO") == [("2", 1), ("1", 1), ("2", 2)]  # reciente primero; sin fecha al final
+    assert idx.buscar(tipo="trafico") == [("1", 2)]
+    assert idx.tipos["trafico"] == "Tráfico"
+    assert idx.buscar(tipo="nada") == []
+
+
+def test_buscar_por_texto_y_tipo():
+    _, idx = indice()
+    assert sorted(idx.buscar(texto="coche")) == [("1", 1), ("2", 2)]
+    assert idx.buscar(tipo="robo", texto="coche plaza") == [("1", 1)]
+    assert idx.buscar(texto="de la") == []  # palabras cortas no filtran
+    assert idx.buscar() == []
+
+
+def test_buscar_por_fechas():
+    _, idx = indice()
+    febrero = fecha_consulta("02/2024"), fecha_consulta("02/2024", fin=True)
+    assert idx.buscar(desde=febrero[0], hasta=febrero[1]) == [("2", 1), ("1", 2)]
+    assert idx.buscar(desde=ordinal("16/02/2024")) == [("2", 1)]
+    assert idx.buscar(hasta=ordinal("31/01/2024")) == [("1", 1)]
+    assert idx.buscar(tipo="robo", desde=febrero[0], hasta=febrero[1]) == [("2", 1)]
+    # Con muchos candidatos por tipo se parte del tramo de fechas y al revés
+    assert idx.buscar(tipo="robo", texto="violencia", desde=febrero[0]) == [("2", 1)]
+
+
+def test_add_y_remove():
+    db, idx = indice()
+    a = db["1"].add("Hurto", "01/03/2024", "Cartera robada")
+    idx.add("1", a)
+    assert idx.buscar(tipo="hurto", desde=ordinal("01/03/2024")) == [("1", 3)]
+
+    idx.remove("1", db["1"].remove(3))
+    assert idx.buscar(tipo="hurto") == []
+    assert "hurto" not in idx.tipos
+    assert idx.buscar(desde=ordinal("01/03/2024")) == []
+
+
+def test_remove_all():
+    db, idx = indice()
+    idx.remove_all("2", db["2"])
+    db["2"].clear()
+    assert idx.buscar(tipo="robo") == [("1", 1)]
+
+
+def test_add_many():
+    db, idx = indice()
+    idx.remove_all("2", db["2"])
+    db["2"].clear()
+    nuevos = [("2", db["2"].add("Robo", f"0{d}/01/2024", "x")) for d in (3, 1, 2)]
+    idx.add_many(nuevos)
+    assert idx._fechas == sorted(idx._fechas)
+    assert idx.buscar(tipo="robo", hasta=ordinal("05/01/2024")) == [("2", 3), ("2", 5), ("2", 4)]
+
+
+def test_add_many_por_lotes():
+    db, idx = indice()
+    enero = ordinal("01/01/2024"), ordinal("31/01/2024")
+    nuevos = [("3", a) for a in (db.setdefault("3", Antecedentes()).add("Estafa", f"0{d}/01/2024", "x") for d in (2, 1))]
+    idx.add_many(nuevos, ordenar=False)
+    assert idx.buscar(tipo="estafa") == [("3", 1), ("3", 2)]  # tipo y palabras, al momento
+    assert idx.buscar(desde=enero[0], hasta=enero[1]) == [("1", 1)]
+    idx.remove("3", db["3"].remove(1))
+    idx.ordenar()
+    assert idx.buscar(desde=enero[0], hasta=enero[1]) == [("1", 1), ("3", 2)]
+    assert idx._fechas == sorted(idx._fechas)
+
+
+def test_rebuild_tras_cambios_en_db():
+    db, idx = indice()
+    db["3"] = Antecedentes()
+    db["3"].add("Estafa", "01/01/2023", "Timo")
+    idx.rebuild()
+    assert idx.buscar(tipo="estafa") == [("3", 1)]
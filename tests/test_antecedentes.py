@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from antecedentes import COMPACTAR_MIN, Antecedentes
+
+
+def campo(a, k):
+    return getattr(a, k)
+
+
+def lista(n):
+    ants = Antecedentes()
+    for i in range(n):
+        ants.add("Robo", "01/01/2020", f"hecho {i + 1}")
+    return ants
+
+
+def test_ids_estables_al_borrar():
+    ants = lista(3)
+    assert campo(ants.remove(2), "descripcion") == "hecho 2"
+    assert ants.remove(2) is None
+    assert [campo(a, "id") for a in ants] == [1, 3]
+    assert campo(ants.get(3), "descripcion") == "hecho 3"
+    assert campo(ants.add("Hurto", "02/01/2020", "nuevo"), "id") == 4
+
+
+def test_clear_no_reutiliza_ids():
+    ants = lista(2)
+    ants.clear()
+    assert len(ants) == 0
+    assert campo(ants.add("Robo", "01/01/2020", "x"), "id") == 3
+
+
+def test_compacta_lapidas():
+    ants = lista(3 * COMPACTAR_MIN)
+    for aid in range(1, 2 * COMPACTAR_MIN + 1):
+        ants.remove(aid)
+    assert ants._muertos < COMPACTAR_MIN  # ya se compactó al menos una vez
+    assert len(ants._items) < 3 * COMPACTAR_MIN
+    assert len(ants) == COMPACTAR_MIN
+    assert campo(ants.get(3 * COMPACTAR_MIN), "descripcion") == f"hecho {3 * COMPACTAR_MIN}"
+    assert ants.get(1) is None
+
+
+def test_page():
+    ants = lista(12)
+    ants.remove(1)
+    assert [campo(a, "id") for a in ants.page(0, 5)] == [2, 3, 4, 5, 6]
+    assert [campo(a, "id") for a in ants.page(2, 5)] == [12]
+    assert list(ants.page(3, 5)) == []
+
+
+def test_json_ida_y_vuelta():
+    ants = lista(3)
+    ants.remove(3)
+    copia = Antecedentes.from_json(ants.to_json())
+    assert copia.to_json() == ants.to_json()
+    assert copia.seq == 3
+    assert campo(copia.add("Robo", "01/01/2020", "x"), "id") == 4
+
+
+def test_formato_antiguo():
+    ants = Antecedentes.from_json([{"id": 2, "tipo": "Robo", "fecha": "05/03/2021", "descripcion": "x"},
+                                   {"id": 5, "tipo": "Hurto", "fecha": "fecha rara", "descripcion": "y"}])
+    assert ants.seq == 5
+    assert ants.get(2).fecha_texto == "05/03/2021"
+    assert ants.get(5).fecha == "fecha rara"
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import json
+
+import bulk
+from records import DNI
+from registry import DNIRegistry
+
+UID_A, UID_B, UID_C = "100000000000000001", "100000000000000002", "100000000000000003"
+
+
+class Store:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def registro():
+    return DNIRegistry(Store({UID_A: DNI("Ana", "Sol", "111111111A", "01/01/1990", "M", "ESP", "01/01/2020", "01/01/2030")}))
+
+
+def fila(uid, numero, **extra):
+    return {"uid": uid, "nombre": "Luis", "apellidos": "Pérez", "dni": numero,
+            "nacimiento": "01/01/1990", "sexo": "H", "nacionalidad": "esp", **extra}
+
+
+def test_formato():
+    assert bulk.formato("datos.CSV") == "csv"
+    assert bulk.formato("datos.jsonl") == "jsonl"
+    assert bulk.formato("datos.ndjson") == "jsonl"
+    assert bulk.formato("datos.json") is None
+    assert bulk.formato("datos.txt") is None
+
+
+def test_leer_csv_detecta_separador_y_bom(tmp_path):
+    path = tmp_path / "d.csv"
+    path.write_text("\ufeffUID;Nombre;DNI\n1;Ana;111111111A\n2;Luis;222222222B\n", encoding="utf-8")
+    assert list(bulk.leer_filas(str(path), "csv")) == [
+        (2, {"uid": "1", "nombre": "Ana", "dni": "111111111A"}),
+        (3, {"uid": "2", "nombre": "Luis", "dni": "222222222B"}),
+    ]
+
+
+def test_leer_jsonl_con_lineas_malas(tmp_path):
+    path = tmp_path / "d.jsonl"
+    path.write_text('{"UID": 1, "nombre": null}\n\n{"uid": \n[1, 2]\n', encoding="utf-8")
+    assert list(bulk.leer_filas(str(path), "jsonl")) == [
+        (1, {"uid": "1", "nombre": ""}),
+        (3, "❌ JSON inválido."),
+        (4, "❌ Cada línea debe ser un objeto JSON."),
+    ]
+
+
+def test_validar_dnis():
+    filas = [
+        (1, fila(UID_B, "222222222b")),
+        (2, fila(UID_C, "222222222B")),   # DNI repetido dentro del fichero
+        (3, fila(UID_B, "333333333C")),   # usuario repetido dentro del fichero
+        (4, fila(UID_A, "444444444D")),   # el usuario ya tiene DNI
+        (5, fila(UID_C, "111111111A")),   # DNI ya registrado
+        (6, fila("123", "555555555E")),   # uid que no es un ID de Discord
+        (7, fila(UID_C, "666666666F", sexo="X")),
+        (8, "❌ JSON inválido."),
+    ]
+    validos, errores = bulk.validar_dnis(filas, registro())
+    assert [(uid, rec.dni, rec.nacionalidad) for uid, rec in validos] == [(UID_B, "222222222B", "ESP")]
+    assert errores == [
+        (2, "❌ Ese DNI ya existe."),
+        (3, "❌ Ese usuario ya tiene DNI."),
+        (4, "❌ Ese usuario ya tiene DNI."),
+        (5, "❌ Ese DNI ya existe."),
+        (6, "❌ uid debe ser el ID de Discord del usuario."),
+        (7, "❌ Sexo debe ser H o M."),
+        (8, "❌ JSON inválido."),
+    ]
+
+
+def test_validar_antecedentes_por_uid_o_dni():
+    base = {"tipo": " Robo ", "fecha": "01/01/2024", "descripcion": "Cartera"}
+    filas = [
+        (1, {"uid": UID_B, **base}),
+        (2, {"dni": "111111111a", **base}),
+        (3, {"dni": "999999999Z", **base}),
+        (4, {"uid": UID_B, **base, "fecha": "ayer"}),
+    ]
+    validos, errores = bulk.validar_antecedentes(filas, registro())
+    assert validos == [(UID_B, ("Robo", "01/01/2024", "Cartera")), (UID_A, ("Robo", "01/01/2024", "Cartera"))]
+    assert errores == [(3, "❌ Falta uid o el DNI no existe."), (4, "❌ Fecha debe ser DD/MM/AAAA.")]
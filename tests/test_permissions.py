@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import permissions
+from permissions import ADMIN, NINGUNO, POLICIA, Permisos
+
+GUILD = 1
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def miembro(mid, *roles):
+    return SimpleNamespace(id=mid, guild=SimpleNamespace(id=GUILD), get_role=lambda rid: rid in roles or None)
+
+
+def test_roles_por_defecto(tmp_path):
+    p = Permisos(str(tmp_path / "roles.json"), admin_defecto=[10], policia_defecto=[20])
+    assert p.nivel(miembro(1, 10, 20)) == ADMIN
+    assert p.nivel(miembro(2, 20)) == POLICIA
+    assert p.nivel(miembro(3, 30)) == NINGUNO
+
+
+def test_cache_caduca_con_ttl(tmp_path, monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(permissions.time, "monotonic", reloj)
+    p = Permisos(str(tmp_path / "roles.json"), policia_defecto=[20], ttl=60)
+    assert p.nivel(miembro(1, 20)) == POLICIA
+    assert p.nivel(miembro(1)) == POLICIA  # aún en caché
+    assert (p.aciertos, p.fallos) == (1, 1)
+    reloj.t += 61
+    assert p.nivel(miembro(1)) == NINGUNO
+
+
+def test_invalidar(tmp_path):
+    p = Permisos(str(tmp_path / "roles.json"), policia_defecto=[20])
+    p.nivel(miembro(1, 20))
+    p.nivel(miembro(2, 20))
+    p.invalidar(GUILD, 1)
+    assert p.nivel(miembro(1)) == NINGUNO
+    assert p.nivel(miembro(2)) == POLICIA
+    p.invalidar(GUILD)
+    assert p.nivel(miembro(2)) == NINGUNO
+
+
+def test_configurar_invalida_y_persiste(tmp_path):
+    path = str(tmp_path / "roles.json")
+    p = Permisos(path, admin_defecto=[10], policia_defecto=[20])
+    assert p.nivel(miembro(1, 30)) == NINGUNO
+    asyncio.run(p.configurar(GUILD, "policia", [30]))
+    assert p.nivel(miembro(1, 30)) == POLICIA
+    assert p.roles(GUILD) == {"admin": frozenset({10}), "policia": frozenset({30})}
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"1": {"admin": [10], "policia": [30]}}
+    assert Permisos(path).roles(GUILD)["policia"] == {30}
+
+    asyncio.run(p.restablecer(GUILD))
+    assert p.nivel(miembro(1, 30)) == NINGUNO
+    assert Permisos(path, policia_defecto=[20]).roles(GUILD)["policia"] == {20}
+
+
+def test_guardar_crea_el_directorio(tmp_path):
+    path = str(tmp_path / "datos" / "roles.json")
+    asyncio.run(Permisos(path).configurar(GUILD, "admin", [10]))
+    assert Permisos(path).roles(GUILD)["admin"] == {10}
+
+
+def test_guardado_fallido_no_cambia_nada(tmp_path, monkeypatch):
+    def falla(*a, **kw):
+        raise OSError("disco lleno")
+    p = Permisos(str(tmp_path / "roles.json"), policia_defecto=[20])
+    assert p.nivel(miembro(1, 20)) == POLICIA
+    monkeypatch.setattr(permissions, "atomic_write_json", falla)
+    with pytest.raises(OSError):
+        asyncio.run(p.configurar(GUILD, "policia", [30]))
+    assert p.roles(GUILD)["policia"] == {20}
+    assert p.nivel(miembro(1, 20)) == POLICIA
+
+
+def test_sin_ttl_no_cachea(tmp_path):
+    p = Permisos(str(tmp_path / "roles.json"), policia_defecto=[20], ttl=0)
+    assert p.nivel(miembro(1, 20)) == POLICIA
+    assert p.nivel(miembro(1)) == NINGUNO
+    assert p.aciertos == 0
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from records import DNI
+from registry import DNIRegistry, normalizar
+
+
+class Store:
+    """Lo mínimo de un almacén que usa DNIRegistry."""
+
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def dni(nombre, apellidos, numero):
+    return DNI(nombre, apellidos, numero, "01/01/1990", "H", "ESP", "01/01/2020", "01/01/2030")
+
+
+def registro():
+    return DNIRegistry(Store({
+        "1": dni("Ana", "Núñez García", "111111111A"),
+        "2": dni("Andrés", "Álvarez", "222222222B"),
+        "3": dni("Luis", "Nuño", "333333333C"),
+    }))
+
+
+def test_normalizar():
+    assert normalizar("Núñez ÁLVAREZ") == "nunez alvarez"
+
+
+def test_indice_y_uid_for_dni():
+    reg = registro()
+    assert len(reg) == 3
+    assert "2" in reg
+    assert reg.uid_for_dni("333333333C") == "3"
+    assert reg.uid_for_dni("999999999Z") is None
+    assert reg.duplicados == []
+
+
+def test_rebuild_detecta_duplicados():
+    reg = DNIRegistry(Store({"1": dni("A", "B", "111111111A"), "2": dni("C", "D", "111111111A")}))
+    assert reg.uid_for_dni("111111111A") == "1"
+    assert reg.duplicados == [("111111111A", "1", "2")]
+
+
+def test_search_por_prefijo_sin_tildes():
+    reg = registro()
+    assert reg.search("nun") == ["1", "3"]     # ordenado por apellidos
+    assert reg.search("AND") == ["2"]
+    assert reg.search("an nu") == ["1"]        # todas las palabras deben casar
+    assert reg.search("1111") == ["1"]         # también por número de DNI
+    assert reg.search("zz") == []
+    assert reg.search("   ") == []
+
+
+def test_search_limite():
+    reg = DNIRegistry(Store({str(i): dni("Ana", f"A{i:02d}", f"{i:09d}A") for i in range(40)}))
+    assert len(reg.search("ana", limit=10)) == 10
+    assert len(reg.search("ana a", limit=10)) == 10
+
+
+def test_search_varias_palabras_parte_de_la_mas_selectiva():
+    datos = {str(i): dni("Ana", f"García A{i:02d}", f"{i:09d}A") for i in range(40)}
+    datos["99"] = dni("Eva", "García Zoe", "999999999Z")
+    reg = DNIRegistry(Store(datos))
+    assert reg.search("garcia z") == ["99"]        # «z» solo casa con un ciudadano
+    assert reg.search("zoe garc eva") == ["99"]
+    assert reg.search("ana zoe") == []
+    assert reg.search("a07 ana garcia") == ["7"]
+
+
+def test_add_reindexa():
+    reg = registro()
+    reg.add("3", dni("Luis", "Pérez", "444444444D"))
+    assert reg.uid_for_dni("333333333C") is None
+    assert reg.uid_for_dni("444444444D") == "3"
+    assert reg.search("nuño") == []
+    assert reg.search("perez") == ["3"]
+
+
+def test_add_many():
+    reg = registro()
+    reg.add_many([("4", dni("Eva", "Sol", "555555555E")), ("1", dni("Ana", "Luna", "111111111A"))])
+    assert reg.search("eva") == ["4"]
+    assert reg.search("luna") == ["1"]
+    assert reg.search("garcia") == []
+    assert reg._names == sorted(reg._names)
+
+
+def test_add_many_por_lotes():
+    reg = registro()
+    reg.add_many([("4", dni("Eva", "Sol", "555555555E")), ("5", dni("Eva", "Mar", "666666666F"))], ordenar=False)
+    reg.add_many([("6", dni("Eva", "Río", "777777777G"))], ordenar=False)
+    assert reg.uid_for_dni("777777777G") == "6"
+    assert reg.search("eva") == []  # aún sin ordenar
+    assert reg.remove("5")
+    reg.add("4", dni("Eva", "Luz", "555555555E"))
+    reg.ordenar()
+    assert reg.search("eva") == ["4", "6"]
+    assert reg.search("sol") == []
+    assert reg._names == sorted(reg._names)
+
+
+def test_remove():
+    reg = registro()
+    assert reg.remove("1")
+    assert not reg.remove("1")
+    assert "1" not in reg
+    assert reg.uid_for_dni("111111111A") is None
+    assert reg.search("nun") == ["3"]
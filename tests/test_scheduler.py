@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import discord
+
+import scheduler
+from scheduler import DeletionScheduler
+
+
+class Cliente:
+    """Lo mínimo de ``discord.Client`` que usa el programador: borra o lanza el siguiente error de la cola."""
+
+    def __init__(self, *errores):
+        self.errores = list(errores)
+        self.borrados = []
+
+    def get_partial_messageable(self, channel_id):
+        return SimpleNamespace(get_partial_message=lambda message_id: SimpleNamespace(
+            delete=lambda: self._delete(channel_id, message_id)))
+
+    async def _delete(self, channel_id, message_id):
+        if self.errores:
+            raise self.errores.pop(0)
+        self.borrados.append((channel_id, message_id))
+
+
+def error_http(cls=discord.HTTPException, status=503):
+    return cls(SimpleNamespace(status=status, reason="error"), "error")
+
+
+def mensaje(channel_id, message_id):
+    return SimpleNamespace(id=message_id, channel=SimpleNamespace(id=channel_id))
+
+
+def ejecutar(sch, segundos=0.05):
+    """Arranca el temporizador, deja pasar ``segundos`` y lo para."""
+    async def main():
+        sch.start()
+        await asyncio.sleep(segundos)
+        await sch.stop()
+    asyncio.run(main())
+
+
+def vencidas(path, *entradas):
+    path.write_text(json.dumps([[time.time() - 1, *e] for e in entradas]), encoding="utf-8")
+    return str(path)
+
+
+def test_programa_y_persiste(tmp_path):
+    path = str(tmp_path / "borrados.json")
+    sch = DeletionScheduler(Cliente(), path)
+    antes = time.time()
+    asyncio.run(sch.schedule(mensaje(1, 2), 30))
+    asyncio.run(sch.schedule(mensaje(1, 3), 10 ** 6))  # se acota a MAX_RETENCION
+    otro = DeletionScheduler(Cliente(), path)
+    assert len(otro) == 2
+    plazos = {e[2]: e[0] - antes for e in otro._heap}
+    assert 29 <= plazos[2] <= 31
+    assert plazos[3] <= scheduler.MAX_RETENCION + 1
+
+
+def test_borra_los_vencidos(tmp_path):
+    cliente = Cliente()
+    path = vencidas(tmp_path / "borrados.json", (1, 2), (1, 3))
+    sch = DeletionScheduler(cliente, path)
+    ejecutar(sch)
+    assert sorted(cliente.borrados) == [(1, 2), (1, 3)]
+    assert len(sch) == 0
+    assert DeletionScheduler(cliente, path)._heap == []
+
+
+def test_error_transitorio_reintenta(tmp_path):
+    cliente = Cliente(error_http(), OSError("sin red"))
+    path = vencidas(tmp_path / "borrados.json", (1, 2), (1, 3))
+    sch = DeletionScheduler(cliente, path)
+    antes = time.time()
+    ejecutar(sch)
+    assert cliente.borrados == []
+    assert sorted(e[1:] for e in sch._heap) == [(1, 2, 1), (1, 3, 1)]
+    assert all(antes + scheduler.REINTENTO_BASE - 1 <= e[0] <= antes + scheduler.REINTENTO_BASE + 1 for e in sch._heap)
+    assert len(DeletionScheduler(cliente, path)) == 2  # los reintentos se guardan
+
+
+def test_mensaje_inexistente_se_descarta(tmp_path):
+    cliente = Cliente(error_http(discord.NotFound, 404), error_http(discord.Forbidden, 403))
+    sch = DeletionScheduler(cliente, vencidas(tmp_path / "borrados.json", (1, 2), (1, 3)))
+    ejecutar(sch)
+    assert cliente.borrados == []
+    assert len(sch) == 0
+
+
+def test_se_rinde_tras_max_intentos(tmp_path):
+    cliente = Cliente(error_http())
+    sch = DeletionScheduler(cliente, vencidas(tmp_path / "borrados.json", (1, 2, scheduler.MAX_INTENTOS - 1)))
+    ejecutar(sch)
+    assert len(sch) == 0
+
+
+def test_carga_entradas_antiguas_sin_intentos(tmp_path):
+    cliente = Cliente()
+    sch = DeletionScheduler(cliente, vencidas(tmp_path / "borrados.json", (1, 2), (1, 3, 4)))
+    ejecutar(sch)
+    assert sorted(cliente.borrados) == [(1, 2), (1, 3)]
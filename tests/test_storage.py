@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import storage
+from records import DNI
+
+
+def ops(*lineas) -> str:
+    return "".join(json.dumps(op) + "\n" for op in lineas)
+
+
+def abrir(path: str, **kw) -> storage.JournalStore:
+    st = storage.JournalStore(path, **kw)
+    st.load()
+    return st
+
+
+def guardar(st):
+    st.flush()
+
+
+def test_replay_aplica_set_y_del(tmp_path):
+    log = tmp_path / "d.json.log"
+    log.write_text(ops({"op": "set", "k": "a", "v": 1},
+                       {"op": "set", "k": "b", "v": 2},
+                       {"op": "del", "k": "a"},
+                       {"op": "del", "k": "x"}), encoding="utf-8")
+    data = {"c": 3}
+    assert storage.replay_journal(str(log), data) == 4
+    assert data == {"b": 2, "c": 3}
+
+
+def test_replay_sin_diario(tmp_path):
+    data = {"a": 1}
+    assert storage.replay_journal(str(tmp_path / "no.log"), data) == 0
+    assert data == {"a": 1}
+
+
+def test_escritura_y_recarga(tmp_path):
+    path = str(tmp_path / "d.json")
+    st = abrir(path)
+    st.set("a", {"n": 1})
+    st.set("b", {"n": 2})
+    st.set("a", {"n": 3})
+    st.delete("b")
+    st.delete("x")  # no existe: no se anota
+    guardar(st)
+    assert abrir(path).data == {"a": {"n": 3}}
+
+
+def test_pendientes_agrupados_por_clave(tmp_path):
+    st = abrir(str(tmp_path / "d.json"))
+    st.set("a", {"n": 1})
+    st.set("b", {"n": 2})
+    st.set("a", {"n": 3})  # se agrupa con el anterior: una sola línea
+    st.delete("b")
+    assert st.pending == 2
+    st.flush()
+    assert not st.dirty
+    with open(st.log_path, encoding="utf-8") as f:
+        assert [json.loads(l) for l in f] == [{"op": "set", "k": "a", "v": {"n": 3}}, {"op": "del", "k": "b"}]
+
+
+def test_compactacion(tmp_path):
+    path = str(tmp_path / "d.json")
+    st = abrir(path, compact_every=3)
+    for i in range(3):
+        st.set(str(i), i)
+        guardar(st)
+    assert os.path.getsize(st.log_path) == 0
+    assert st.ops == 0
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"0": 0, "1": 1, "2": 2}
+
+    st.delete("1")
+    guardar(st)
+    otro = abrir(path)
+    assert otro.data == {"0": 0, "2": 2}
+    assert otro.ops == 1
+
+
+def test_compactacion_reaplicable(tmp_path):
+    # Muerte entre el reemplazo de la instantánea y el vaciado del diario
+    path = tmp_path / "d.json"
+    path.write_text(json.dumps({"a": 2}), encoding="utf-8")
+    (tmp_path / "d.json.log").write_text(ops({"op": "set", "k": "a", "v": 2}), encoding="utf-8")
+    assert abrir(str(path)).data == {"a": 2}
+
+
+def test_cola_rota_se_recorta_antes_de_escribir(tmp_path):
+    path = str(tmp_path / "d.json")
+    log = tmp_path / "d.json.log"
+    log.write_text(ops({"op": "set", "k": "a", "v": 1}, {"op": "set", "k": "b", "v": 2})
+                   + '{"op": "set", "k": "x", "v"', encoding="utf-8")
+    st = abrir(path)
+    assert st.data == {"a": 1, "b": 2}
+    st.set("c", 3)
+    st.flush()
+    assert abrir(path).data == {"a": 1, "b": 2, "c": 3}
+
+
+def test_repair_journal(tmp_path):
+    log = tmp_path / "d.json.log"
+    assert storage.repair_journal(str(log)) == 0
+    completo = ops({"op": "set", "k": "a", "v": "x" * 5000})
+    log.write_text(completo, encoding="utf-8")
+    assert storage.repair_journal(str(log)) == 0
+    log.write_text(completo + '{"op"', encoding="utf-8")
+    assert storage.repair_journal(str(log)) == 5
+    assert log.read_text(encoding="utf-8") == completo
+    log.write_text('{"op": "set"', encoding="utf-8")
+    assert storage.repair_journal(str(log)) == 12
+    assert log.read_text(encoding="utf-8") == ""
+
+
+def test_codec(tmp_path):
+    path = str(tmp_path / "d.json")
+    st = storage.JournalStore(path, encode=DNI.to_json, decode=DNI.from_json)
+    st.set("1", DNI("Ana", "Núñez", "123456789Z", "01/02/1990", "M", "ESP", "01/01/2020", "01/01/2030"))
+    st.flush()
+    rec = abrir(path, encode=DNI.to_json, decode=DNI.from_json).data["1"]
+    assert isinstance(rec, DNI)
+    assert rec.to_json()["nacimiento"] == "01/02/1990"
+
+
+def test_almacen_retirado_rechaza_escrituras(tmp_path):
+    st = storage.JournalStore(str(tmp_path / "d.json"))
+    st.retired = True
+    with pytest.raises(storage.StoreRetired):
+        st.set("a", 1)
+
+
+def test_escritor_retenido_no_vuelca(tmp_path):
+    st = storage.JournalStore(str(tmp_path / "d.json"))
+    writer = storage.BackgroundWriter([st], delay=0)
+
+    async def main():
+        writer.start()
+        async with writer.retener():
+            for i in range(3):
+                st.set(str(i), i)
+                await asyncio.sleep(0.02)
+            assert st.pending == 3
+        await asyncio.sleep(0.05)
+        assert not st.dirty
+        await writer.stop()
+    asyncio.run(main())
+    assert abrir(st.path).data == {"0": 0, "1": 1, "2": 2}
+
+
+# ───── SQLite ─────
+def dni(numero: str) -> dict:
+    return {"nombre": "A", "apellidos": "B", "dni": numero, "nacimiento": "01/01/2000",
+            "sexo": "H", "nacionalidad": "ESP", "expedicion": "01/01/2020", "caducidad": "01/01/2030"}
+
+
+def test_sqlite_dni_unico_e_importacion(tmp_path):
+    dni_path, antec_path = tmp_path / "d.json", tmp_path / "a.json"
+    dni_path.write_text(json.dumps({"1": dni("111111111A"), "2": dni("111111111A"), "3": dni("222222222B")}))
+    antec_path.write_text(json.dumps({"1": [{"id": 1, "tipo": "Robo", "fecha": "01/01/2020", "descripcion": "x"}]}))
+    db = storage.SqliteDB(str(tmp_path / "datos.sqlite3"))
+    try:
+        dnis, ants, conflictos = db.import_json(str(dni_path), str(antec_path))
+        assert sorted(dnis) == ["1", "3"]
+        assert conflictos == [("2", "111111111A")]
+
+        st = storage.SqliteStore(db, storage.DniTable)
+        assert st.fetch("1")["dni"] == "111111111A"
+        assert st.fetch("2") is None
+        ants_st = storage.SqliteStore(db, storage.AntecedentesTable)
+        assert ants_st.fetch("1")["seq"] == 1
+
+        # Una baja y el alta que reutiliza su DNI en el mismo volcado
+        st.load()
+        st.delete("3")
+        st.set("4", dni("222222222B"))
+        st.flush()
+        assert st.fetch("4")["dni"] == "222222222B"
+    finally:
+        db.close()
+
+
+def test_sqlite_volcados_en_orden_y_visibles(tmp_path):
+    db = storage.SqliteDB(str(tmp_path / "datos.sqlite3"))
+    try:
+        st = storage.SqliteStore(db, storage.DniTable)
+        dentro, sigue = threading.Event(), threading.Event()
+        escribir = db.write
+        def lenta(table, changes):  # retiene el primer volcado a mitad de escritura
+            if not dentro.is_set():
+                dentro.set()
+                sigue.wait(5)
+            escribir(table, changes)
+        db.write = lenta
+
+        st.set("1", dni("111111111A"))
+        primero = threading.Thread(target=st.flush)
+        primero.start()
+        assert dentro.wait(5)
+        assert st.fetch("1")["dni"] == "111111111A"  # en vuelo: se sirve desde memoria
+
+        st.set("1", dni("222222222B"))
+        segundo = threading.Thread(target=st.flush)
+        segundo.start()
+        time.sleep(0.05)
+        sigue.set()
+        primero.join()
+        segundo.join()
+        assert not st.dirty
+        assert st.fetch("1")["dni"] == "222222222B"  # el lote nuevo se confirmó el último
+    finally:
+        db.close()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Trazas de latencia de las interacciones y respuesta dentro del plazo de Discord.
+
+Discord da 3 s para responder a una interacción. Cada comando, modal y botón
+trazado lleva una ``Traza`` en ``interaction.extras`` que acumula el tiempo
+de sus etapas (permisos, datos, render, respuesta) y arranca un vigilante:
+si a los ``DIFERIR_EN`` segundos aún no se ha respondido, difiere la
+respuesta y el manejador sigue con followups sin enterarse.
+
+Un candado por interacción impide que el vigilante y el manejador respondan
+a la vez, así que las respuestas pasan por ``responder``, ``editar``,
+``abrir_modal`` y ``diferir`` en lugar de ``interaction.response``.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+import discord
+
+DIFERIR_EN = float(os.getenv("DIFERIR_EN", 2.0))   # s desde que llega; deja margen al retardo del gateway
+LENTA      = float(os.getenv("TRAZA_LENTA", 1.0))  # s a partir de los que se avisa en el log
+
+on_fin = None  # callback(traza, resultado) al terminar cada interacción trazada
+
+
+class Traza:
+    __slots__ = ("nombre", "t0", "etapas", "lock", "edita", "diferida", "fin", "_vigia")
+
+    def __init__(self, nombre: str = None, edita: bool = False):
+        self.nombre   = nombre     # None: interacción sin trazar (solo se usa el candado)
+        self.t0       = time.perf_counter()
+        self.etapas   = {}         # etapa -> segundos acumulados
+        self.lock     = asyncio.Lock()
+        self.edita    = edita      # al diferir, editar el mensaje del componente en vez de «pensando…»
+        self.diferida = False
+        self.fin      = None       # duración total una vez terminada
+        self._vigia   = None
+
+    @contextmanager
+    def etapa(self, nombre: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + time.perf_counter() - t0
+
+
+def traza(interaction: discord.Interaction) -> Traza:
+    t = interaction.extras.get("traza")
+    if t is None:
+        t = interaction.extras["traza"] = Traza()
+    return t
+
+
+def etapa(interaction: discord.Interaction, nombre: str):
+    """``with etapa(interaction, "datos"): ...`` suma el bloque a esa etapa."""
+    return traza(interaction).etapa(nombre)
+
+
+def iniciar(interaction: discord.Interaction, nombre: str, edita: bool = False) -> Traza:
+    t = interaction.extras["traza"] = Traza(nombre, edita)
+    t._vigia = asyncio.create_task(_vigilar(interaction, t))
+    return t
+
+
+def terminar(interaction: discord.Interaction, resultado: str):
+    t = interaction.extras.get("traza")
+    if t is None or t.nombre is None or t.fin is not None:
+        return
+    t.fin = time.perf_counter() - t.t0
+    t._vigia.cancel()
+    if t.fin >= LENTA:
+        etapas = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in t.etapas.items())
+        print(f"⚠️ Interacción lenta: {t.nombre} {t.fin * 1000:.0f}ms ({resultado}) "
+              f"usuario={interaction.user.id} servidor={interaction.guild_id} "
+              f"diferida={'sí' if t.diferida else 'no'} {etapas}")
+    if on_fin:
+        on_fin(t, resultado)
+
+
+async def _vigilar(interaction: discord.Interaction, t: Traza):
+    await asyncio.sleep(DIFERIR_EN)
+    async with t.lock:
+        if interaction.response.is_done():
+            return
+        try:
+            if t.edita:
+                await interaction.response.defer()
+            else:
+                await interaction.response.defer(ephemeral=True, thinking=True)
+        except discord.HTTPException:
+            return  # token ya caducado: no hay nada que salvar
+        t.diferida = True
+
+
+def trazado(nombre: str = None, edita: bool = False):
+    """Traza ``on_submit`` de un modal o el callback de un botón.
+
+    Los comandos de barra se trazan desde el ``CommandTree`` (ver main.DNITree).
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        async def envoltura(self, interaction: discord.Interaction, *args):
+            iniciar(interaction, nombre or f"{type(self).__name__}.{fn.__name__}", edita)
+            try:
+                await fn(self, interaction, *args)
+            except Exception:
+                terminar(interaction, "error")
+                raise
+            terminar(interaction, "ok")
+        return envoltura
+    return deco
+
+
+# ───── Respuestas ─────
+async def responder(interaction: discord.Interaction, content: str = None, **kwargs):
+    """Responde a la interacción, o con un followup si ya se respondió o difirió."""
+    if content is not None:
+        kwargs["content"] = content
+    t = traza(interaction)
+    async with t.lock:
+        with t.etapa("respuesta"):
+            if not interaction.response.is_done():
+                return await interaction.response.send_message(**kwargs)
+            return await interaction.followup.send(**kwargs)
+
+
+async def editar(interaction: discord.Interaction, **kwargs):
+    """Edita el mensaje del componente; tras diferir, a través de la respuesta original."""
+    t = traza(interaction)
+    async with t.lock:
+        with t.etapa("respuesta"):
+            if not interaction.response.is_done():
+                return await interaction.response.edit_message(**kwargs)
+            return await interaction.edit_original_response(**kwargs)
+
+
+async def abrir_modal(interaction: discord.Interaction, modal: discord.ui.Modal) -> bool:
+    """Abre ``modal``; si el vigilante ya difirió, ya no se puede y se avisa."""
+    t = traza(interaction)
+    async with t.lock:
+        if not interaction.response.is_done():
+            with t.etapa("respuesta"):
+                await interaction.response.send_modal(modal)
+            return True
+    await responder(interaction, "⌛ El bot ha tardado demasiado en abrir el formulario; vuelve a usar el comando.", ephemeral=True)
+    return False
+
+
+async def diferir(interaction: discord.Interaction, **kwargs):
+    t = traza(interaction)
+    async with t.lock:
+        if not interaction.response.is_done():
+            await interaction.response.defer(**kwargs)
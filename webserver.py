@@ -1,15 +1,30 @@
-from flask import Flask
-from threading import Thread
+import os
 
-app = Flask('')
+from aiohttp import web
 
-@app.route('/')
-def index():
-    return 'Hello from Flask!'
+PORT = int(os.getenv("PORT", 8000))
 
-def run():
-    app.run(host='0.0.0.0', port=8000)
 
-def keep_alive():
-    server = Thread(target=run)
-    server.start()    
\ No newline at end of file
+async def keep_alive(health, metrics) -> web.AppRunner:
+    """Arranca el servidor HTTP en el bucle de eventos del bot.
+
+    ``health()`` devuelve ``(ok, datos)`` y ``metrics()`` el texto de /metrics.
+    """
+    async def index(request):
+        return web.Response(text="Hello from aiohttp!")
+
+    async def salud(request):
+        ok, datos = health()
+        return web.json_response(datos, status=200 if ok else 503)
+
+    async def metricas(request):
+        return web.Response(text=metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/", index)
+    app.router.add_get("/health", salud)
+    app.router.add_get("/metrics", metricas)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", PORT).start()
+    return runner